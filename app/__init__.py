@@ -1,4 +0,0 @@
-from app import models  # noqa: F401
-from app.conf import Settings
-
-settings = Settings()
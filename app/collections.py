@@ -1,17 +1,40 @@
 from collections.abc import Sequence
+from typing import Any
 from uuid import UUID
 
 from fastapi import HTTPException
 from fastapi import status as http_status
+from fastapi_pagination import set_page
+from fastapi_pagination.ext.sqlalchemy import paginate as paginate_rows
 from fastapi_pagination.ext.sqlmodel import paginate
 from fastapi_pagination.limit_offset import LimitOffsetPage, LimitOffsetParams
-from sqlmodel import SQLModel, col, delete, select
+from sqlalchemy import ARRAY, Delete, Row, Update, Uuid, any_, bindparam
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import SQLModel, col, delete, select, update
 from sqlmodel.ext.asyncio.session import AsyncSession
+from sqlmodel.sql.expression import Select, SelectOfScalar
 
-from app.models import Entitlement, EntitlementCreate, EntitlementUpdate, UUIDModel
+from app.models import (
+    Entitlement,
+    EntitlementCreate,
+    EntitlementId,
+    EntitlementUpdate,
+    UUIDModel,
+    VersionedModel,
+)
+
+SERIALIZATION_FAILURE = "40001"
 
 
 class BaseCollection[ModelT: UUIDModel, ModelCreateT: SQLModel, ModelUpdateT: SQLModel]:
+    # The column the table is partitioned by, if any. Passing its value to the queries below
+    # (as `partition_value`) lets PostgreSQL prune all the other partitions.
+    partition_key: str | None = None
+    # The table mapping every ID to its partition key (see app.models.EntitlementId), if any.
+    # The queries by ID without a `partition_value` look it up there, so that PostgreSQL can
+    # still prune the other partitions (at execution time).
+    partition_key_lookup_model: type[SQLModel] | None = None
+
     def __init__(self, session: AsyncSession):
         self.session = session
 
@@ -43,8 +66,39 @@ class BaseCollection[ModelT: UUIDModel, ModelCreateT: SQLModel, ModelUpdateT: SQ
 
         return obj
 
-    async def get(self, id: str | UUID) -> ModelT:
-        obj = await self.session.get(self.model_cls, id)
+    def _projected_select(self, fields: Sequence[str]):
+        return select(*(col(getattr(self.model_cls, field)) for field in fields))
+
+    def _filter_partition[StatementT: Select | SelectOfScalar | Update | Delete](
+        self, statement: StatementT, partition_value: Any | None, id: str | UUID | None = None
+    ) -> StatementT:
+        if self.partition_key is None:
+            return statement
+
+        partition_column = col(getattr(self.model_cls, self.partition_key))
+
+        if partition_value is not None:
+            return statement.where(partition_column == partition_value)
+
+        if id is not None and self.partition_key_lookup_model is not None:
+            lookup_model = self.partition_key_lookup_model
+            lookup = select(col(getattr(lookup_model, self.partition_key))).where(
+                col(lookup_model.id) == id
+            )
+            return statement.where(partition_column == lookup.scalar_subquery())
+
+        return statement
+
+    async def _get_or_none(
+        self, id: str | UUID, partition_value: Any | None = None
+    ) -> ModelT | None:
+        statement = select(self.model_cls).where(col(self.model_cls.id) == id)
+        results = await self.session.exec(self._filter_partition(statement, partition_value, id))
+
+        return results.first()
+
+    async def get(self, id: str | UUID, partition_value: Any | None = None) -> ModelT:
+        obj = await self._get_or_none(id, partition_value)
 
         if obj is None:
             raise HTTPException(
@@ -54,38 +108,173 @@ class BaseCollection[ModelT: UUIDModel, ModelCreateT: SQLModel, ModelUpdateT: SQ
 
         return obj
 
-    async def fetch_all(self) -> Sequence[ModelT]:
-        results = await self.session.exec(select(self.model_cls))
+    async def get_many(
+        self, ids: Sequence[UUID], partition_value: Any | None = None
+    ) -> list[ModelT | None]:
+        """
+        Fetch the objects with the given IDs with a single query, returned in the same
+        order as the IDs, with None for the IDs which weren't found.
+        """
+        # NOTE: ANY() with a single array parameter (instead of IN with one parameter per ID)
+        #       keeps the statement the same regardless of the number of IDs, so that asyncpg's
+        #       prepared statement cache can be reused.
+        ids_param = bindparam("ids", list(ids), type_=ARRAY(Uuid))
+        statement = select(self.model_cls).where(col(self.model_cls.id) == any_(ids_param))
+        results = await self.session.exec(self._filter_partition(statement, partition_value))
+
+        objs_by_id = {obj.id: obj for obj in results.all()}
+
+        return [objs_by_id.get(id) for id in ids]
+
+    async def get_projected(
+        self, id: str | UUID, fields: Sequence[str], partition_value: Any | None = None
+    ) -> dict[str, Any]:
+        """
+        Same as `get`, but only the given columns are selected from the database
+        and the object is returned as a dictionary.
+        """
+        statement = self._projected_select(fields).where(self.model_cls.id == id)
+        results = await self.session.exec(self._filter_partition(statement, partition_value, id))
+        row = results.first()
+
+        if row is None:
+            raise HTTPException(
+                status_code=http_status.HTTP_404_NOT_FOUND,
+                detail=f"{self.model_cls.__name__} with ID {str(id)} wasn't found",
+            )
+
+        return row._asdict()
+
+    async def fetch_all(self, partition_value: Any | None = None) -> Sequence[ModelT]:
+        statement = self._filter_partition(select(self.model_cls), partition_value)
+        results = await self.session.exec(statement)
         return results.all()
 
     async def fetch_page(
-        self, pagination_params: LimitOffsetParams | None = None
+        self,
+        pagination_params: LimitOffsetParams | None = None,
+        partition_value: Any | None = None,
     ) -> LimitOffsetPage[ModelT]:
-        return await paginate(self.session, self.model_cls, pagination_params)
+        statement = self._filter_partition(select(self.model_cls), partition_value)
+        return await paginate(self.session, statement, pagination_params)
 
-    async def update(self, id: str | UUID, data: ModelUpdateT) -> ModelT:
-        statement = select(self.model_cls).where(self.model_cls.id == id)
-        results = await self.session.exec(statement)
+    async def fetch_projected_page(
+        self,
+        fields: Sequence[str],
+        pagination_params: LimitOffsetParams | None = None,
+        partition_value: Any | None = None,
+    ) -> LimitOffsetPage[dict[str, Any]]:
+        """
+        Same as `fetch_page`, but only the given columns are selected from the database
+        and the items are returned as dictionaries.
+        """
 
-        obj: ModelT | None = results.first()
+        def rows_to_dicts(rows: Sequence[Row]) -> list[dict[str, Any]]:
+            return [row._asdict() for row in rows]
 
-        if obj is None:
+        with set_page(LimitOffsetPage[dict[str, Any]]):
+            return await paginate_rows(
+                self.session,
+                self._filter_partition(self._projected_select(fields), partition_value),
+                pagination_params,
+                transformer=rows_to_dicts,
+                unwrap_mode="no-unwrap",
+            )
+
+    async def update(
+        self, id: str | UUID, data: ModelUpdateT, partition_value: Any | None = None
+    ) -> ModelT:
+        values = data.model_dump(exclude_unset=True)
+        expected_version = values.pop("version", None)
+
+        # Nothing to update: don't bump the version (which would make the clients holding the
+        # current version fail with a conflict), but still check the version that was sent.
+        if not values:
+            obj = await self.get(id, partition_value)
+
+            if (
+                isinstance(obj, VersionedModel)
+                and expected_version is not None
+                and obj.version != expected_version
+            ):
+                raise HTTPException(
+                    status_code=http_status.HTTP_409_CONFLICT,
+                    detail=(
+                        f"{self.model_cls.__name__} with ID {str(id)} has been modified, "
+                        f"it's no longer at version {expected_version}"
+                    ),
+                )
+
+            return obj
+
+        # NOTE: The update is done with a single conditional UPDATE ... RETURNING statement
+        #       instead of a read-modify-write, so that concurrent updates don't overwrite each
+        #       other without having to lock the row. For versioned models the version is
+        #       bumped, and if the client sent the version it based the update on, the update
+        #       only applies if the row is still at that version.
+        statement = update(self.model_cls).where(col(self.model_cls.id) == id)
+        statement = self._filter_partition(statement, partition_value, id)
+
+        if issubclass(self.model_cls, VersionedModel):
+            values["version"] = col(self.model_cls.version) + 1
+
+            if expected_version is not None:
+                statement = statement.where(col(self.model_cls.version) == expected_version)
+
+        statement = statement.values(**values).returning(self.model_cls)
+
+        try:
+            results = await self.session.execute(statement=statement)
+        except DBAPIError as e:
+            # A concurrent update moved the row to another partition (e.g. by changing its
+            # partition key) before this one could lock it.
+            if getattr(e.orig, "sqlstate", None) != SERIALIZATION_FAILURE:
+                raise  # pragma: no cover
+
+            await self.session.rollback()
             raise HTTPException(
-                status_code=http_status.HTTP_404_NOT_FOUND,
-                detail=f"{self.model_cls.__name__} with ID {str(id)} wasn't found",
+                status_code=http_status.HTTP_409_CONFLICT,
+                detail=(
+                    f"{self.model_cls.__name__} with ID {str(id)} has been modified concurrently"
+                ),
             )
 
-        for key, value in data.model_dump(exclude_unset=True).items():
-            setattr(obj, key, value)
+        obj: ModelT | None = results.scalar_one_or_none()
+
+        if obj is None:
+            await self.session.rollback()
+
+            if await self._get_or_none(id, partition_value) is None:
+                raise HTTPException(
+                    status_code=http_status.HTTP_404_NOT_FOUND,
+                    detail=f"{self.model_cls.__name__} with ID {str(id)} wasn't found",
+                )
+
+            if expected_version is not None:
+                raise HTTPException(
+                    status_code=http_status.HTTP_409_CONFLICT,
+                    detail=(
+                        f"{self.model_cls.__name__} with ID {str(id)} has been modified, "
+                        f"it's no longer at version {expected_version}"
+                    ),
+                )
+
+            # The partition key of the row was looked up (see `_filter_partition`) before a
+            # concurrent update changed it, without moving the row to another partition.
+            raise HTTPException(
+                status_code=http_status.HTTP_409_CONFLICT,
+                detail=(
+                    f"{self.model_cls.__name__} with ID {str(id)} has been modified concurrently"
+                ),
+            )
 
-        self.session.add(obj)
         await self.session.commit()
-        await self.session.refresh(obj)
 
         return obj
 
-    async def delete(self, id: str | UUID) -> bool:
+    async def delete(self, id: str | UUID, partition_value: Any | None = None) -> bool:
         statement = delete(self.model_cls).where(col(self.model_cls.id) == id)
+        statement = self._filter_partition(statement, partition_value, id)
 
         await self.session.execute(statement=statement)
         await self.session.commit()
@@ -94,4 +283,5 @@ class BaseCollection[ModelT: UUIDModel, ModelCreateT: SQLModel, ModelUpdateT: SQ
 
 
 class EntitlementCollection(BaseCollection[Entitlement, EntitlementCreate, EntitlementUpdate]):
-    pass
+    partition_key = "sponsor_container_id"
+    partition_key_lookup_model = EntitlementId
@@ -0,0 +1,181 @@
+import zlib
+from collections.abc import Callable
+from typing import Protocol
+
+import brotli
+import zstandard
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+EXCLUDED_CONTENT_TYPES = ("text/event-stream",)
+
+
+class Compressor(Protocol):
+    def compress(self, data: bytes) -> bytes: ...
+
+    def flush(self) -> bytes: ...
+
+
+class BrotliCompressor:
+    def __init__(self, quality: int = 4):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+
+# NOTE: The order of this mapping is the server preference, it's used to break ties
+#       when the client accepts multiple encodings with the same quality value.
+COMPRESSORS: dict[str, Callable[[], Compressor]] = {
+    "zstd": lambda: zstandard.ZstdCompressor(level=3).compressobj(),
+    "br": lambda: BrotliCompressor(quality=4),
+    "gzip": lambda: zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS),
+}
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """
+    Pick the best supported content coding for the given Accept-Encoding header value,
+    or None if the response should not be compressed.
+    """
+    qualities: dict[str, float] = {}
+
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+
+        if not coding:
+            continue
+
+        quality = 1.0
+        param_name, _, param_value = params.strip().partition("=")
+
+        if param_name.strip().lower() == "q":
+            try:
+                quality = float(param_value)
+            except ValueError:
+                quality = 0.0
+
+        qualities[coding] = quality
+
+    wildcard_quality = qualities.get("*", 0.0)
+    candidates = [
+        (qualities.get(coding, wildcard_quality), coding)
+        for coding in COMPRESSORS
+        if qualities.get(coding, wildcard_quality) > 0
+    ]
+
+    if not candidates:
+        return None
+
+    # max() returns the first of equal elements, so the server preference wins ties
+    return max(candidates, key=lambda candidate: candidate[0])[1]
+
+
+class CompressionMiddleware:
+    """
+    Compress responses with the best content coding accepted by the client (zstd, br or gzip),
+    as long as the body is at least ``minimum_size`` bytes.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 500):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        responder = CompressionResponder(self.app, encoding, self.minimum_size)
+        await responder(scope, receive, send)
+
+
+class CompressionResponder:
+    def __init__(self, app: ASGIApp, encoding: str, minimum_size: int):
+        self.app = app
+        self.encoding = encoding
+        self.minimum_size = minimum_size
+        self.send: Send
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+        self.compressor: Compressor
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_with_compression)
+
+    async def send_with_compression(self, message: Message) -> None:
+        message_type = message["type"]
+
+        if message_type == "http.response.start":
+            # Hold the initial message until we know whether the body gets compressed,
+            # since that changes the outgoing headers.
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            self.passthrough = "content-encoding" in headers or headers.get(
+                "content-type", ""
+            ).startswith(EXCLUDED_CONTENT_TYPES)
+            return
+
+        if message_type != "http.response.body":  # pragma: no cover
+            await self.send(message)
+            return
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if not self.started:
+            self.started = True
+
+            if len(body) < self.minimum_size and not more_body:
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+
+            self.compressor = COMPRESSORS[self.encoding]()
+
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoding
+            headers.add_vary_header("Accept-Encoding")
+
+            if more_body:
+                del headers["Content-Length"]
+
+            message["body"] = self._compress(body, more_body=more_body)
+
+            if not more_body:
+                headers["Content-Length"] = str(len(message["body"]))
+
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        message["body"] = self._compress(body, more_body=more_body)
+        await self.send(message)
+
+    def _compress(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self.compressor.compress(body)
+
+        if not more_body:
+            data += self.compressor.flush()
+
+        return data
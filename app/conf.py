@@ -1,3 +1,4 @@
+import functools
 import pathlib
 
 from pydantic import PostgresDsn, computed_field
@@ -21,6 +22,14 @@ class Settings(BaseSettings):
 
     debug: bool = False
 
+    compression_minimum_size: int = 500
+
+    query_budget_default: int | None = None
+
+    slow_query_threshold_ms: float | None = None
+    slow_query_explain_sample_rate: float = 0.0
+    slow_query_report_size: int = 20
+
     @computed_field
     def postgres_async_url(self) -> PostgresDsn:
         return PostgresDsn.build(
@@ -31,3 +40,8 @@ class Settings(BaseSettings):
             port=self.postgres_port,
             path=self.postgres_db,
         )
+
+
+@functools.cache
+def get_settings() -> Settings:
+    return Settings()
@@ -1,27 +1,48 @@
+import functools
 import sys
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
 from typing import Annotated
 
 from fastapi import Depends
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel import text
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from app import settings
+from app.conf import get_settings
+from app.query_counter import install_query_counter
+from app.slow_queries import get_slow_query_log
 
 running_tests = "pytest" in sys.modules
 
-db_engine = create_async_engine(
-    str(settings.postgres_async_url),
-    echo=False if running_tests else settings.debug,
-    future=True,
-)
+
+@functools.cache
+def get_db_engine() -> AsyncEngine:
+    # NOTE: The engine is created on first use rather than at import time, so that importing
+    #       the app (e.g. to generate the OpenAPI schema) doesn't require database settings.
+    settings = get_settings()
+
+    engine = create_async_engine(
+        str(settings.postgres_async_url),
+        echo=False if running_tests else settings.debug,
+        future=True,
+    )
+    install_query_counter(engine)
+
+    if (slow_query_log := get_slow_query_log()) is not None:
+        slow_query_log.install(engine)
+
+    return engine
+
+
+@functools.cache
+def get_db_sessionmaker() -> sessionmaker:
+    return sessionmaker(bind=get_db_engine(), class_=AsyncSession, expire_on_commit=False)
 
 
 async def get_db_session() -> AsyncIterator[AsyncSession]:
-    async_session = sessionmaker(bind=db_engine, class_=AsyncSession, expire_on_commit=False)
+    async_session = get_db_sessionmaker()
     async with async_session() as session:
         yield session
 
@@ -0,0 +1,92 @@
+import asyncio
+from collections.abc import Sequence
+from typing import Any
+from uuid import UUID
+
+from fastapi import HTTPException
+from fastapi import status as http_status
+
+from app.collections import BaseCollection
+
+
+class CollectionLoader[ModelT]:
+    """
+    DataLoader-style batcher for `BaseCollection.get`: all the `load` calls made within the
+    same event loop tick are collapsed into a single `BaseCollection.get_many` query.
+
+    Meant to be request-scoped (like the session of the collection), as a dependency, e.g.
+    `app.routers.entitlements.EntitlementLoader`. The session doesn't support concurrent
+    operations, so there is at most one query in flight: the loads made meanwhile are
+    queued, and make up the next batch.
+    """
+
+    def __init__(self, collection: BaseCollection[Any, Any, Any]):
+        self.collection = collection
+        self._queue: list[tuple[UUID, asyncio.Future[ModelT]]] = []
+        self._dispatching = False
+        self._dispatch_task: asyncio.Task | None = None
+
+    async def load(self, id: str | UUID) -> ModelT:
+        try:
+            id = UUID(str(id))
+        except ValueError:
+            raise self._not_found(id) from None
+
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[ModelT] = loop.create_future()
+
+        if not self._dispatching:
+            self._dispatching = True
+            loop.call_soon(self._start_dispatch)
+
+        self._queue.append((id, future))
+
+        return await future
+
+    async def load_many(self, ids: Sequence[str | UUID]) -> list[ModelT]:
+        return await asyncio.gather(*(self.load(id) for id in ids))
+
+    def _not_found(self, id: str | UUID) -> HTTPException:
+        return HTTPException(
+            status_code=http_status.HTTP_404_NOT_FOUND,
+            detail=f"{self.collection.model_cls.__name__} with ID {str(id)} wasn't found",
+        )
+
+    def _start_dispatch(self) -> None:
+        queue, self._queue = self._queue, []
+
+        self._dispatch_task = asyncio.get_running_loop().create_task(self._dispatch(queue))
+        self._dispatch_task.add_done_callback(self._on_dispatch_done)
+
+    def _on_dispatch_done(self, task: asyncio.Task) -> None:
+        self._dispatch_task = None
+
+        if self._queue:
+            self._start_dispatch()
+        else:
+            self._dispatching = False
+
+    async def _dispatch(self, queue: list[tuple[UUID, asyncio.Future[ModelT]]]) -> None:
+        ids = list(dict.fromkeys(id for id, _ in queue))
+
+        try:
+            objs = await self.collection.get_many(ids)
+        except Exception as e:
+            for _, future in queue:
+                if not future.done():
+                    future.set_exception(e)
+
+            return
+
+        objs_by_id = dict(zip(ids, objs, strict=True))
+
+        for id, future in queue:
+            if future.done():  # pragma: no cover
+                continue
+
+            obj = objs_by_id[id]
+
+            if obj is None:
+                future.set_exception(self._not_found(id))
+            else:
+                future.set_result(obj)
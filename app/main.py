@@ -1,12 +1,9 @@
 import logging
 from contextlib import asynccontextmanager
 
-import fastapi_pagination
 from fastapi import FastAPI
 
-from app import settings
-from app.db import verify_db_connection
-from app.routers import entitlements
+from app.conf import Settings, get_settings
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +17,7 @@ async def lifespan(app: FastAPI):  # pragma: no cover
     # refs:
     #     * https://fastapi.tiangolo.com/advanced/async-tests/#run-it
     #     * https://github.com/florimondmanca/asgi-lifespan#usage
+    from app.db import verify_db_connection
 
     await verify_db_connection()
     yield
@@ -30,21 +28,55 @@ tags_metadata = [
         "name": "Entitlements",
         "description": "Operations with entitlements",
     },
+    {
+        "name": "Diagnostics",
+        "description": "Runtime diagnostics of the API",
+    },
 ]
 
 
-app = FastAPI(
-    title="Optscale Operations API",
-    description="API to be used by Operators to manage Optscale",
-    openapi_tags=tags_metadata,
-    root_path="/v1",
-    debug=settings.debug,
-    lifespan=lifespan,
-)
+def create_app(settings: Settings | None = None) -> FastAPI:
+    """
+    Build the FastAPI application.
+
+    Importing this module has no side effects: the settings are only loaded and the
+    routers (and with them the models and the DB layer) only imported when this is called.
+    The database engine itself is only created when the first request needs it.
+    """
+    import fastapi_pagination
+
+    from app.compression import CompressionMiddleware
+    from app.db import running_tests
+    from app.query_counter import QueryCounterMiddleware
+    from app.routers import diagnostics, entitlements
+    from app.slow_queries import SlowQueryMiddleware
+
+    settings = settings or get_settings()
+
+    app = FastAPI(
+        title="Optscale Operations API",
+        description="API to be used by Operators to manage Optscale",
+        openapi_tags=tags_metadata,
+        root_path="/v1",
+        debug=settings.debug,
+        lifespan=lifespan,
+    )
+
+    app.add_middleware(
+        QueryCounterMiddleware,
+        default_budget=settings.query_budget_default,
+        strict=settings.debug or running_tests,
+    )
+    app.add_middleware(SlowQueryMiddleware)
+    app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_minimum_size)
 
-fastapi_pagination.add_pagination(app)
+    # TODO: Add healthcheck
 
+    app.include_router(entitlements.router, prefix="/entitlements", tags=["Entitlements"])
+    app.include_router(diagnostics.router, prefix="/diagnostics", tags=["Diagnostics"])
 
-# TODO: Add healthcheck
+    # NOTE: add_pagination patches the routes which are already registered, so it has to be
+    #       called after all the routers have been included.
+    fastapi_pagination.add_pagination(app)
 
-app.include_router(entitlements.router, prefix="/entitlements", tags=["Entitlements"])
+    return app
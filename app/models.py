@@ -4,17 +4,15 @@ import uuid
 import sqlalchemy as sa
 from sqlmodel import Field, SQLModel
 
+ENTITLEMENTS_PARTITIONS = 8
+
 
 class UUIDModel(SQLModel):
     id: uuid.UUID = Field(
         primary_key=True,
         nullable=False,
         default_factory=uuid.uuid4,
-        index=True,
-        sa_column_kwargs={
-            "server_default": sa.text("gen_random_uuid()"),
-            "unique": True,
-        },
+        sa_column_kwargs={"server_default": sa.text("gen_random_uuid()")},
     )
 
 
@@ -37,6 +35,14 @@ class TimestampModel(SQLModel):
     )
 
 
+class VersionedModel(SQLModel):
+    version: int = Field(
+        default=1,
+        nullable=False,
+        sa_column_kwargs={"server_default": sa.text("1")},
+    )
+
+
 class SoftDeletedModel(SQLModel):
     soft_deleted: bool = Field(
         nullable=False,
@@ -51,8 +57,15 @@ class EntitlementBase(SQLModel):
     sponsor_container_id: str = Field(max_length=255, nullable=False)
 
 
-class Entitlement(EntitlementBase, TimestampModel, UUIDModel, table=True):
+class Entitlement(EntitlementBase, VersionedModel, TimestampModel, UUIDModel, table=True):
     __tablename__ = "entitlements"
+    # NOTE: The table is hash-partitioned by sponsor container, so that every partition is
+    #       vacuumed and indexed separately, and queries filtering by sponsor_container_id only
+    #       scan one partition. PostgreSQL requires the partition key to be part of the primary
+    #       key, so the uniqueness of the IDs is enforced by the entitlement_ids table instead.
+    __table_args__ = {"postgresql_partition_by": "HASH (sponsor_container_id)"}
+
+    sponsor_container_id: str = Field(max_length=255, nullable=False, primary_key=True)
 
     activated_at: datetime.datetime | None = Field(
         default=None,
@@ -61,8 +74,110 @@ class Entitlement(EntitlementBase, TimestampModel, UUIDModel, table=True):
     )
 
 
+class EntitlementId(SQLModel, table=True):
+    """
+    The IDs of all the entitlements (across partitions) with their partition key, kept in sync
+    by triggers on the entitlements table. Tables referencing entitlements should use this one
+    as the target of their foreign key.
+    """
+
+    __tablename__ = "entitlement_ids"
+
+    id: uuid.UUID = Field(primary_key=True, nullable=False)
+    sponsor_container_id: str = Field(max_length=255, nullable=False)
+
+
+# NOTE: Moving a row to another partition (by updating its sponsor_container_id) fires the DELETE
+#       trigger and then the INSERT one, while the row is already in its new partition.
+ENTITLEMENTS_SYNC_IDS_FUNCTION = """
+CREATE OR REPLACE FUNCTION entitlements_sync_ids() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO entitlement_ids (id, sponsor_container_id)
+        VALUES (NEW.id, NEW.sponsor_container_id)
+        ON CONFLICT (id) DO NOTHING;
+
+        IF NOT FOUND AND NOT EXISTS (
+            SELECT FROM entitlement_ids
+            WHERE id = NEW.id AND sponsor_container_id = NEW.sponsor_container_id
+        ) THEN
+            RAISE unique_violation USING MESSAGE = 'Duplicate entitlement ID ' || NEW.id;
+        END IF;
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE entitlement_ids SET sponsor_container_id = NEW.sponsor_container_id
+        WHERE id = NEW.id;
+    ELSE
+        UPDATE entitlement_ids SET sponsor_container_id = e.sponsor_container_id
+        FROM entitlements e
+        WHERE entitlement_ids.id = OLD.id AND e.id = OLD.id;
+
+        IF NOT FOUND THEN
+            DELETE FROM entitlement_ids WHERE id = OLD.id;
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END
+$$
+"""
+
+ENTITLEMENTS_SYNC_IDS_TRIGGERS = [
+    """
+    CREATE TRIGGER sync_ids AFTER INSERT OR DELETE ON entitlements
+    FOR EACH ROW EXECUTE FUNCTION entitlements_sync_ids()
+    """,
+    # Only fired when the row stays in the same partition, see above
+    """
+    CREATE TRIGGER sync_ids_on_update AFTER UPDATE OF sponsor_container_id ON entitlements
+    FOR EACH ROW WHEN (OLD.sponsor_container_id IS DISTINCT FROM NEW.sponsor_container_id)
+    EXECUTE FUNCTION entitlements_sync_ids()
+    """,
+]
+
+for remainder in range(ENTITLEMENTS_PARTITIONS):
+    sa.event.listen(
+        Entitlement.__table__,
+        "after_create",
+        sa.DDL(
+            f"CREATE TABLE entitlements_p{remainder} PARTITION OF entitlements "
+            f"FOR VALUES WITH (MODULUS {ENTITLEMENTS_PARTITIONS}, REMAINDER {remainder})"
+        ),
+    )
+
+for statement in (ENTITLEMENTS_SYNC_IDS_FUNCTION, *ENTITLEMENTS_SYNC_IDS_TRIGGERS):
+    sa.event.listen(Entitlement.__table__, "after_create", sa.DDL(statement))
+
+sa.event.listen(
+    Entitlement.__table__, "after_drop", sa.DDL("DROP FUNCTION IF EXISTS entitlements_sync_ids")
+)
+
+
 class EntitlementRead(EntitlementBase, UUIDModel):
     activated_at: datetime.datetime | None
+    version: int
+
+
+class EntitlementProjection(SQLModel):
+    """
+    An entitlement with only the fields requested with ``fields`` (see app.projection),
+    the others are left out of the response.
+    """
+
+    id: uuid.UUID
+    sponsor_name: str | None = None
+    sponsor_external_id: str | None = None
+    sponsor_container_id: str | None = None
+    activated_at: datetime.datetime | None = None
+    version: int | None = None
+
+
+class EntitlementLookup(SQLModel):
+    ids: list[uuid.UUID] = Field(min_length=1, max_length=1000)
+
+
+class EntitlementLookupResult(SQLModel):
+    items: list[EntitlementRead]
+    not_found: list[uuid.UUID]
 
 
 class EntitlementCreate(EntitlementBase):
@@ -73,3 +188,10 @@ class EntitlementUpdate(EntitlementBase):
     sponsor_name: str | None = None
     sponsor_external_id: str | None = None
     sponsor_container_id: str | None = None
+    version: int | None = Field(
+        default=None,
+        description=(
+            "The version of the entitlement the update is based on. If provided and the "
+            "entitlement has been updated since, the update is rejected with a 409."
+        ),
+    )
@@ -0,0 +1,48 @@
+from typing import Annotated
+
+from fastapi import HTTPException, Query
+from fastapi import status as http_status
+from sqlmodel import SQLModel
+
+
+class FieldsProjection:
+    """
+    Dependency which parses the ``fields`` query parameter (a comma-separated list of
+    field names of ``model_cls``) into the list of columns that need to be selected.
+
+    The ``id`` field is always part of the projection, ``None`` means no projection.
+    """
+
+    def __init__(self, model_cls: type[SQLModel]):
+        self.model_cls = model_cls
+
+    async def __call__(
+        self,
+        fields: Annotated[
+            str | None,
+            Query(
+                description=(
+                    "Comma-separated list of fields to include in the response. "
+                    "All fields are returned if omitted."
+                ),
+                examples=["sponsor_name,activated_at"],
+            ),
+        ] = None,
+    ) -> list[str] | None:
+        if fields is None:
+            return None
+
+        requested = [field.strip() for field in fields.split(",") if field.strip()]
+
+        if not requested:
+            return None
+
+        unknown = [field for field in requested if field not in self.model_cls.model_fields]
+
+        if unknown:
+            raise HTTPException(
+                status_code=http_status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Unknown fields for {self.model_cls.__name__}: {', '.join(unknown)}",
+            )
+
+        return list(dict.fromkeys(["id", *requested]))
@@ -0,0 +1,128 @@
+import logging
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# NOTE: SQLAlchemy runs the sync engine code in a greenlet which shares the context of the
+#       calling task, so the counters set here are visible from the engine event listener.
+_active_counters: ContextVar[tuple["QueryCounter", ...]] = ContextVar(
+    "active_query_counters", default=()
+)
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+@dataclass
+class QueryCounter:
+    budget: int | None = None
+    strict: bool = False
+    statements: list[str] = field(default_factory=list)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def exceeded(self) -> bool:
+        return self.budget is not None and self.count > self.budget
+
+    def record(self, statement: str) -> None:
+        self.statements.append(statement)
+
+        if self.strict and self.exceeded:
+            raise QueryBudgetExceeded(
+                f"Executed {self.count} queries, exceeding the budget of {self.budget}. "
+                f"Last statement: {statement}"
+            )
+
+
+@contextmanager
+def count_queries(budget: int | None = None, strict: bool = False) -> Iterator[QueryCounter]:
+    """
+    Count the SQL statements executed within the block (counters can be nested,
+    every active counter records every statement).
+    """
+    counter = QueryCounter(budget=budget, strict=strict)
+    token = _active_counters.set((*_active_counters.get(), counter))
+
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+
+def get_current_query_counter() -> QueryCounter | None:
+    counters = _active_counters.get()
+    return counters[-1] if counters else None
+
+
+def _record_statement(conn, cursor, statement, parameters, context, executemany):
+    for counter in _active_counters.get():
+        counter.record(statement)
+
+
+def install_query_counter(engine: AsyncEngine) -> None:
+    event.listen(engine.sync_engine, "before_cursor_execute", _record_statement)
+
+
+class QueryBudget:
+    """
+    Dependency which sets the maximum number of queries a route is expected to execute,
+    overriding the default budget of the `QueryCounterMiddleware`.
+
+    .. code-block:: python
+
+        @router.get("/", dependencies=[Depends(QueryBudget(2))])
+        async def get_items(): ...
+    """
+
+    def __init__(self, max_queries: int):
+        self.max_queries = max_queries
+
+    # NOTE: Async, so that FastAPI runs it on the event loop, within the context of the request
+    #       (where the counter of the QueryCounterMiddleware is set), rather than in the threadpool.
+    async def __call__(self) -> None:
+        counter = get_current_query_counter()
+
+        if counter is not None:
+            counter.budget = self.max_queries
+
+
+class QueryCounterMiddleware:
+    """
+    Count the queries executed by each request and log the requests which exceed
+    their query budget. In strict mode the query exceeding the budget raises
+    `QueryBudgetExceeded` instead, so that N+1 queries fail loudly in debug and tests.
+    """
+
+    def __init__(self, app: ASGIApp, default_budget: int | None = None, strict: bool = False):
+        self.app = app
+        self.default_budget = default_budget
+        self.strict = strict
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        with count_queries(budget=self.default_budget, strict=self.strict) as counter:
+            await self.app(scope, receive, send)
+
+        if counter.exceeded:
+            route = scope.get("route")
+            logger.warning(
+                "%s %s executed %d queries, exceeding its budget of %d",
+                scope["method"],
+                getattr(route, "path", scope["path"]),
+                counter.count,
+                counter.budget,
+            )
@@ -0,0 +1,17 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends
+
+from app.slow_queries import SlowQueryLog, SlowQueryStats, get_slow_query_log
+
+router = APIRouter()
+
+SlowQueryLogDep = Annotated[SlowQueryLog | None, Depends(get_slow_query_log)]
+
+
+@router.get("/slow-queries", response_model=list[SlowQueryStats])
+async def get_slow_queries(slow_query_log: SlowQueryLogDep):
+    if slow_query_log is None:
+        return []
+
+    return slow_query_log.report()
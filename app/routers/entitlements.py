@@ -1,32 +1,134 @@
-from fastapi import APIRouter, status
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, Query, status
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from fastapi_pagination.limit_offset import LimitOffsetPage
 
 from app.collections import EntitlementCollection
 from app.db import DBSession
-from app.models import EntitlementCreate, EntitlementRead, EntitlementUpdate
+from app.loaders import CollectionLoader
+from app.models import (
+    Entitlement,
+    EntitlementCreate,
+    EntitlementLookup,
+    EntitlementLookupResult,
+    EntitlementProjection,
+    EntitlementRead,
+    EntitlementUpdate,
+)
+from app.projection import FieldsProjection
+from app.query_counter import QueryBudget
 
 router = APIRouter()
 
+EntitlementFields = Annotated[list[str] | None, Depends(FieldsProjection(EntitlementRead))]
+SponsorContainerId = Annotated[
+    str | None,
+    Query(
+        description=(
+            "Only look for entitlements of this sponsor container. "
+            "Entitlements are partitioned by sponsor container, so this makes the lookup faster."
+        ),
+    ),
+]
+
+
+def get_entitlement_loader(session: DBSession) -> CollectionLoader[Entitlement]:
+    return CollectionLoader[Entitlement](EntitlementCollection(session=session))
+
+
+# NOTE: Dependencies are cached per request, so all the dependants of a request share the same
+#       loader (and its session is the same as the route's `DBSession`).
+EntitlementLoader = Annotated[CollectionLoader[Entitlement], Depends(get_entitlement_loader)]
 
-@router.get("/", response_model=LimitOffsetPage[EntitlementRead])
-async def get_entitlements(session: DBSession):
+
+# NOTE: Projected results are returned as a JSONResponse, so that they are not validated
+#       against EntitlementRead (which requires all the fields to be present). They are
+#       still part of the response_model, as EntitlementProjection, for the OpenAPI schema.
+
+
+@router.get(
+    "/",
+    response_model=LimitOffsetPage[EntitlementRead | EntitlementProjection],
+    dependencies=[Depends(QueryBudget(2))],
+)
+async def get_entitlements(
+    session: DBSession, fields: EntitlementFields, sponsor_container_id: SponsorContainerId = None
+):
     entitlements = EntitlementCollection(session=session)
-    return await entitlements.fetch_page()
 
+    if fields is None:
+        return await entitlements.fetch_page(partition_value=sponsor_container_id)
+
+    page = await entitlements.fetch_projected_page(
+        fields=fields, partition_value=sponsor_container_id
+    )
+    return JSONResponse(jsonable_encoder(page))
 
-@router.get("/{id}", response_model=EntitlementRead)
-async def get_entitlement_by_id(id: str, session: DBSession):
+
+@router.get(
+    "/{id}",
+    response_model=EntitlementRead | EntitlementProjection,
+    dependencies=[Depends(QueryBudget(1))],
+)
+async def get_entitlement_by_id(
+    id: str,
+    session: DBSession,
+    fields: EntitlementFields,
+    sponsor_container_id: SponsorContainerId = None,
+):
+    entitlements = EntitlementCollection(session=session)
+
+    if fields is None:
+        return await entitlements.get(id=id, partition_value=sponsor_container_id)
+
+    obj = await entitlements.get_projected(
+        id=id, fields=fields, partition_value=sponsor_container_id
+    )
+    return JSONResponse(jsonable_encoder(obj))
+
+
+@router.post(
+    "/lookup",
+    response_model=EntitlementLookupResult,
+    dependencies=[Depends(QueryBudget(1))],
+)
+async def lookup_entitlements(
+    data: EntitlementLookup, session: DBSession, sponsor_container_id: SponsorContainerId = None
+):
     entitlements = EntitlementCollection(session=session)
-    return await entitlements.get(id=id)
+
+    ids = list(dict.fromkeys(data.ids))
+    objs = await entitlements.get_many(ids=ids, partition_value=sponsor_container_id)
+
+    return EntitlementLookupResult(
+        items=[obj for obj in objs if obj is not None],
+        not_found=[id for id, obj in zip(ids, objs, strict=True) if obj is None],
+    )
 
 
-@router.post("/", response_model=EntitlementRead, status_code=status.HTTP_201_CREATED)
+@router.post(
+    "/",
+    response_model=EntitlementRead,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(QueryBudget(2))],
+)
 async def create_entitlement(data: EntitlementCreate, session: DBSession):
     entitlements = EntitlementCollection(session=session)
     return await entitlements.create(data=data)
 
 
-@router.patch("/{id}", response_model=EntitlementRead)
-async def update_entitlement(id: str, data: EntitlementUpdate, session: DBSession):
+@router.patch(
+    "/{id}",
+    response_model=EntitlementRead,
+    dependencies=[Depends(QueryBudget(2))],
+)
+async def update_entitlement(
+    id: str,
+    data: EntitlementUpdate,
+    session: DBSession,
+    sponsor_container_id: SponsorContainerId = None,
+):
     entitlements = EntitlementCollection(session=session)
-    return await entitlements.update(id=id, data=data)
+    return await entitlements.update(id=id, data=data, partition_value=sponsor_container_id)
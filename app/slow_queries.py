@@ -0,0 +1,247 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import random
+import re
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.conf import get_settings
+
+logger = logging.getLogger(__name__)
+
+_current_scope: ContextVar[Scope | None] = ContextVar("slow_queries_current_scope", default=None)
+
+
+@dataclass
+class SlowQueryStats:
+    statement: str
+    parameters: Any
+    calls: int = 0
+    total_duration_ms: float = 0.0
+    max_duration_ms: float = 0.0
+    last_route: str | None = None
+    plan: Any = None
+
+
+def get_parameters_shape(parameters: Any) -> Any:
+    """
+    Describe the bound parameters by their types only, so that no values end up in the logs.
+    """
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+
+    if isinstance(parameters, list | tuple):
+        if parameters and isinstance(parameters[0], dict | list | tuple):  # executemany
+            return {"rows": len(parameters), "row": get_parameters_shape(parameters[0])}
+
+        return [type(value).__name__ for value in parameters]
+
+    return type(parameters).__name__
+
+
+_LITERAL_RE = re.compile(
+    r"'(?:[^']|'')*'"  # strings (and everything cast from one, e.g. '...'::uuid)
+    r"|(?<![\w.$])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?(?![\w.])"  # numbers
+)
+
+
+def redact_plan(plan: Any) -> Any:
+    """
+    Mask the literals in the conditions of an EXPLAIN (FORMAT JSON) plan. EXPLAIN ANALYZE plans
+    the statement with the values of its parameters, so they show up in e.g. the "Index Cond".
+    """
+    if isinstance(plan, dict):
+        return {key: redact_plan(value) for key, value in plan.items()}
+
+    if isinstance(plan, list):
+        return [redact_plan(value) for value in plan]
+
+    if isinstance(plan, str):
+        return _LITERAL_RE.sub("?", plan)
+
+    return plan
+
+
+def get_current_route() -> str | None:
+    scope = _current_scope.get()
+
+    if scope is None:
+        return None
+
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+class SlowQueryLog:
+    """
+    Log the statements slower than ``threshold_ms`` and keep the top ``report_size`` of them
+    (by total duration) in memory. A sample of the slow SELECT statements is also run again
+    with ``EXPLAIN (ANALYZE, BUFFERS)`` on a separate connection, to capture their plan
+    (with the literal values masked, see `redact_plan`).
+
+    Since EXPLAIN ANALYZE runs the statement again, at most ``max_concurrent_explains`` of them
+    run at a time (the slow queries sampled meanwhile aren't explained), each one limited to
+    ``explain_timeout_ms``, so that they don't add to the load of an already slow database.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        explain_sample_rate: float = 0.0,
+        report_size: int = 20,
+        max_concurrent_explains: int = 1,
+        explain_timeout_ms: int = 5000,
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.report_size = report_size
+        self.max_concurrent_explains = max_concurrent_explains
+        self.explain_timeout_ms = explain_timeout_ms
+        self.stats: dict[str, SlowQueryStats] = {}
+        self._explain_tasks: set[asyncio.Task] = set()
+
+    def install(self, engine: AsyncEngine) -> None:
+        self.engine = engine
+        event.listen(engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def uninstall(self) -> None:
+        event.remove(self.engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(self.engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    # NOTE: The start time is kept on the execution context of the statement, rather than on
+    #       the (pooled) connection, since after_cursor_execute isn't called if the statement fails.
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._slow_query_start_time = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # The statements of the EXPLAINs themselves are left out (see `_explain`)
+        if not context.execution_options.get("slow_query_log", True):
+            return
+
+        duration_ms = (time.perf_counter() - context._slow_query_start_time) * 1000
+
+        if duration_ms < self.threshold_ms:
+            return
+
+        stats = self.record(statement, parameters, duration_ms, get_current_route())
+
+        if (
+            statement.lstrip().upper().startswith("SELECT")
+            and len(self._explain_tasks) < self.max_concurrent_explains
+            and random.random() < self.explain_sample_rate  # nosec: B311
+        ):
+            self._schedule_explain(stats, statement, parameters)
+
+    def record(
+        self, statement: str, parameters: Any, duration_ms: float, route: str | None
+    ) -> SlowQueryStats:
+        parameters_shape = get_parameters_shape(parameters)
+
+        logger.warning(
+            "Slow query (%.1f ms) on %s: %s",
+            duration_ms,
+            route,
+            statement,
+            extra={
+                "duration_ms": duration_ms,
+                "route": route,
+                "statement": statement,
+                "parameters": parameters_shape,
+            },
+        )
+
+        stats = self.stats.get(statement)
+
+        if stats is None:
+            if len(self.stats) >= self.report_size:
+                fastest = min(self.stats.values(), key=lambda s: s.total_duration_ms)
+                del self.stats[fastest.statement]
+
+            stats = self.stats[statement] = SlowQueryStats(statement, parameters_shape)
+
+        stats.calls += 1
+        stats.total_duration_ms += duration_ms
+        stats.max_duration_ms = max(stats.max_duration_ms, duration_ms)
+        stats.last_route = route
+
+        return stats
+
+    def report(self) -> list[SlowQueryStats]:
+        return sorted(self.stats.values(), key=lambda s: s.total_duration_ms, reverse=True)
+
+    def _schedule_explain(self, stats: SlowQueryStats, statement: str, parameters: Any) -> None:
+        # NOTE: This runs within the greenlet of the query, thus within the event loop. The
+        #       EXPLAIN runs in a task with an empty context, so that it isn't counted as part
+        #       of the current request (see app.query_counter).
+        task = asyncio.get_running_loop().create_task(
+            self._explain(stats, statement, parameters), context=contextvars.Context()
+        )
+        self._explain_tasks.add(task)
+        task.add_done_callback(self._explain_tasks.discard)
+
+    async def _explain(self, stats: SlowQueryStats, statement: str, parameters: Any) -> None:
+        try:
+            async with self.engine.connect() as conn:
+                await conn.execution_options(slow_query_log=False)
+                # The statement is actually executed by ANALYZE, so never commit anything
+                async with conn.begin() as transaction:
+                    await conn.exec_driver_sql(
+                        f"SET LOCAL statement_timeout = {int(self.explain_timeout_ms)}"
+                    )
+                    result = await conn.exec_driver_sql(
+                        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}", parameters
+                    )
+                    stats.plan = redact_plan(result.scalar_one())
+                    await transaction.rollback()
+        except Exception:
+            logger.exception("Could not EXPLAIN slow query: %s", statement)
+            return
+
+        logger.info("Plan of slow query %s", statement, extra={"plan": stats.plan})
+
+    async def wait_for_explains(self) -> None:
+        await asyncio.gather(*self._explain_tasks)
+
+
+@functools.cache
+def get_slow_query_log() -> SlowQueryLog | None:
+    settings = get_settings()
+
+    if settings.slow_query_threshold_ms is None:
+        return None
+
+    return SlowQueryLog(
+        threshold_ms=settings.slow_query_threshold_ms,
+        explain_sample_rate=settings.slow_query_explain_sample_rate,
+        report_size=settings.slow_query_report_size,
+    )
+
+
+class SlowQueryMiddleware:
+    """
+    Keep track of the current request, so that slow queries can be reported with their route.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":  # pragma: no cover
+            await self.app(scope, receive, send)
+            return
+
+        token = _current_scope.set(scope)
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _current_scope.reset(token)
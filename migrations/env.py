@@ -7,10 +7,12 @@ from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import AsyncEngine
 from sqlmodel import SQLModel
 
-from app import settings as app_settings
+from app.conf import get_settings
 from app.models import *  # noqa: F403
+from app.models import ENTITLEMENTS_PARTITIONS
 
 config = context.config
+app_settings = get_settings()
 
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
@@ -26,6 +28,15 @@ target_metadata.naming_convention = {
 }
 
 
+# Partitions are created by the migrations of their partitioned table, they aren't part of the
+# metadata, so autogenerate must not try to drop them.
+PARTITION_TABLES = {f"entitlements_p{remainder}" for remainder in range(ENTITLEMENTS_PARTITIONS)}
+
+
+def include_name(name, type_, parent_names) -> bool:
+    return not (type_ == "table" and name in PARTITION_TABLES)
+
+
 def run_migrations_offline() -> None:
     """Run migrations in 'offline' mode.
 
@@ -42,6 +53,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=str(app_settings.postgres_async_url),
         target_metadata=target_metadata,
+        include_name=include_name,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -51,7 +63,9 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection, target_metadata=target_metadata, include_name=include_name
+    )
 
     with context.begin_transaction():
         context.run_migrations()
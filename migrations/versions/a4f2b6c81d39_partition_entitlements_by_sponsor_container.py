@@ -0,0 +1,196 @@
+"""partition_entitlements_by_sponsor_container
+
+Revision ID: a4f2b6c81d39
+Revises: 5c1d3e8a9b47
+Create Date: 2024-12-18 09:41:07.285113
+
+"""
+import uuid
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+import sqlmodel
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4f2b6c81d39'
+down_revision: Union[str, None] = '5c1d3e8a9b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Keep in sync with app.models.ENTITLEMENTS_PARTITIONS (changing it requires a new migration)
+PARTITIONS = 8
+
+COPY_BATCH_SIZE = 10_000
+
+COLUMNS = (
+    "id, created_at, updated_at, version, sponsor_name, "
+    "sponsor_external_id, sponsor_container_id, activated_at"
+)
+
+# Keep in sync with app.models.ENTITLEMENTS_SYNC_IDS_FUNCTION
+SYNC_IDS_FUNCTION = """
+CREATE OR REPLACE FUNCTION entitlements_sync_ids() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO entitlement_ids (id, sponsor_container_id)
+        VALUES (NEW.id, NEW.sponsor_container_id)
+        ON CONFLICT (id) DO NOTHING;
+
+        IF NOT FOUND AND NOT EXISTS (
+            SELECT FROM entitlement_ids
+            WHERE id = NEW.id AND sponsor_container_id = NEW.sponsor_container_id
+        ) THEN
+            RAISE unique_violation USING MESSAGE = 'Duplicate entitlement ID ' || NEW.id;
+        END IF;
+    ELSIF TG_OP = 'UPDATE' THEN
+        UPDATE entitlement_ids SET sponsor_container_id = NEW.sponsor_container_id
+        WHERE id = NEW.id;
+    ELSE
+        UPDATE entitlement_ids SET sponsor_container_id = e.sponsor_container_id
+        FROM entitlements e
+        WHERE entitlement_ids.id = OLD.id AND e.id = OLD.id;
+
+        IF NOT FOUND THEN
+            DELETE FROM entitlement_ids WHERE id = OLD.id;
+        END IF;
+    END IF;
+
+    RETURN NULL;
+END
+$$
+"""
+
+# Replays the writes made to the (still in use) entitlements table while it's copied
+MIRROR_FUNCTION = f"""
+CREATE FUNCTION entitlements_mirror_to_partitioned() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        DELETE FROM entitlements_partitioned WHERE id = OLD.id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO entitlements_partitioned ({COLUMNS})
+        VALUES ({', '.join(f'NEW.{column}' for column in COLUMNS.split(', '))});
+    END IF;
+
+    RETURN NULL;
+END
+$$
+"""  # nosec: B608
+
+# The rows are locked (FOR SHARE) while they're copied, so that they can't be updated or
+# deleted between being read and being copied, which would escape the mirroring trigger.
+COPY_BATCH = f"""
+WITH batch AS (
+    SELECT {COLUMNS} FROM entitlements
+    WHERE id > :last_id
+    ORDER BY id
+    LIMIT :batch_size
+    FOR SHARE
+), copied AS (
+    INSERT INTO entitlements_partitioned ({COLUMNS})
+    SELECT {COLUMNS} FROM batch
+    ON CONFLICT DO NOTHING
+)
+SELECT id FROM batch ORDER BY id DESC LIMIT 1
+"""  # nosec: B608
+
+
+def entitlements_columns() -> list[sa.Column]:
+    return [
+        sa.Column('id', sa.Uuid(), server_default=sa.text('gen_random_uuid()'), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('current_timestamp(0)'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('current_timestamp(0)'), nullable=False),
+        sa.Column('version', sa.Integer(), server_default=sa.text('1'), nullable=False),
+        sa.Column('sponsor_name', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('sponsor_external_id', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('sponsor_container_id', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+        sa.Column('activated_at', sa.DateTime(timezone=True), nullable=True),
+    ]
+
+
+def upgrade() -> None:
+    # NOTE: The partitioned table is built next to the existing one, which stays in use: its
+    #       writes are mirrored by a trigger, and its rows are copied in batches, each in its
+    #       own transaction. The existing table is only locked to swap the two tables at the end.
+    #       If the copy fails midway, drop entitlements_partitioned, entitlement_ids and the
+    #       mirroring trigger and function before running the migration again.
+
+    # The unique index on id duplicates the primary key index
+    op.drop_index(op.f('ix_entitlements_id'), table_name='entitlements')
+
+    op.create_table('entitlement_ids',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('sponsor_container_id', sqlmodel.sql.sqltypes.AutoString(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_entitlement_ids'))
+    )
+
+    # The partition key has to be part of the primary key, so the uniqueness of the IDs
+    # (across partitions) is enforced by entitlement_ids instead.
+    op.create_table('entitlements_partitioned',
+    *entitlements_columns(),
+    sa.PrimaryKeyConstraint('id', 'sponsor_container_id', name='pk_entitlements_partitioned'),
+    postgresql_partition_by='HASH (sponsor_container_id)',
+    )
+
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f'CREATE TABLE entitlements_p{remainder} PARTITION OF entitlements_partitioned '
+            f'FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})'
+        )
+
+    # NOTE: Until the tables are swapped, "entitlements" in the function body refers to the
+    #       existing table, which is where the rows are current.
+    op.execute(SYNC_IDS_FUNCTION)
+    op.execute(
+        'CREATE TRIGGER sync_ids AFTER INSERT OR DELETE ON entitlements_partitioned '
+        'FOR EACH ROW EXECUTE FUNCTION entitlements_sync_ids()'
+    )
+    op.execute(
+        'CREATE TRIGGER sync_ids_on_update AFTER UPDATE OF sponsor_container_id ON entitlements_partitioned '
+        'FOR EACH ROW WHEN (OLD.sponsor_container_id IS DISTINCT FROM NEW.sponsor_container_id) '
+        'EXECUTE FUNCTION entitlements_sync_ids()'
+    )
+
+    op.execute(MIRROR_FUNCTION)
+    op.execute(
+        'CREATE TRIGGER mirror_to_partitioned AFTER INSERT OR UPDATE OR DELETE ON entitlements '
+        'FOR EACH ROW EXECUTE FUNCTION entitlements_mirror_to_partitioned()'
+    )
+
+    with op.get_context().autocommit_block():
+        connection = op.get_bind()
+        # gen_random_uuid() and uuid4() never generate the nil UUID
+        last_id = uuid.UUID(int=0)
+
+        while last_id is not None:
+            last_id = connection.execute(
+                sa.text(COPY_BATCH), {'last_id': last_id, 'batch_size': COPY_BATCH_SIZE}
+            ).scalar_one_or_none()
+
+    # Dropping the table drops its mirroring trigger
+    op.drop_table('entitlements')
+    op.execute('DROP FUNCTION entitlements_mirror_to_partitioned')
+    op.rename_table('entitlements_partitioned', 'entitlements')
+    op.execute('ALTER TABLE entitlements RENAME CONSTRAINT pk_entitlements_partitioned TO pk_entitlements')
+
+
+def downgrade() -> None:
+    # NOTE: Unlike the upgrade, the rows are copied back within the migration transaction,
+    #       so the entitlements table is locked for the whole copy.
+    op.rename_table('entitlements', 'entitlements_partitioned')
+    op.execute('ALTER TABLE entitlements_partitioned RENAME CONSTRAINT pk_entitlements TO pk_entitlements_partitioned')
+
+    op.create_table('entitlements',
+    *entitlements_columns(),
+    sa.PrimaryKeyConstraint('id', name=op.f('pk_entitlements'))
+    )
+    op.create_index(op.f('ix_entitlements_id'), 'entitlements', ['id'], unique=True)
+
+    op.execute(f'INSERT INTO entitlements ({COLUMNS}) SELECT {COLUMNS} FROM entitlements_partitioned')  # nosec: B608
+    # Dropping a partitioned table drops all its partitions (and their triggers)
+    op.drop_table('entitlements_partitioned')
+    op.execute('DROP FUNCTION entitlements_sync_ids')
+    op.drop_table('entitlement_ids')
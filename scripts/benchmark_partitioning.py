@@ -0,0 +1,251 @@
+"""
+Compare a plain entitlements table (primary key on id, index on sponsor_container_id) with the
+hash-partitioned one (see app.models.Entitlement), at scale, on:
+
+* per-sponsor container queries (count and first page), which only scan one partition when
+  partitioned
+* lookups by id, with the sponsor container (one partition) or through entitlement_ids
+* index size
+* VACUUM after a sponsor container's entitlements have been updated, which only needs to
+  process the container's partition when partitioned
+
+Both tables hold the same rows (same ids). The tables are created in a scratch schema of the
+configured database, dropped at the end.
+"""
+
+import asyncio
+import statistics
+import time
+
+import typer
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.db import get_db_engine
+from app.models import ENTITLEMENTS_PARTITIONS
+
+SCHEMA = "benchmark_partitioning"
+
+COLUMNS = """
+    id uuid NOT NULL DEFAULT gen_random_uuid(),
+    created_at timestamptz NOT NULL DEFAULT current_timestamp(0),
+    updated_at timestamptz NOT NULL DEFAULT current_timestamp(0),
+    version integer NOT NULL DEFAULT 1,
+    sponsor_name varchar(255) NOT NULL,
+    sponsor_external_id varchar(255) NOT NULL,
+    sponsor_container_id varchar(255) NOT NULL,
+    activated_at timestamptz
+"""
+
+SETUP = [
+    f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+    f"CREATE SCHEMA {SCHEMA}",
+    f"CREATE TABLE {SCHEMA}.source ({COLUMNS})",
+    f"CREATE TABLE {SCHEMA}.plain ({COLUMNS}, PRIMARY KEY (id))",
+    f"CREATE INDEX ix_plain_sponsor_container_id ON {SCHEMA}.plain (sponsor_container_id)",
+    f"""
+    CREATE TABLE {SCHEMA}.partitioned ({COLUMNS}, PRIMARY KEY (id, sponsor_container_id))
+    PARTITION BY HASH (sponsor_container_id)
+    """,
+    f"""
+    CREATE TABLE {SCHEMA}.entitlement_ids (
+        id uuid PRIMARY KEY,
+        sponsor_container_id varchar(255) NOT NULL
+    )
+    """,
+    *(
+        f"""
+        CREATE TABLE {SCHEMA}.partitioned_p{remainder} PARTITION OF {SCHEMA}.partitioned
+        FOR VALUES WITH (MODULUS {ENTITLEMENTS_PARTITIONS}, REMAINDER {remainder})
+        """
+        for remainder in range(ENTITLEMENTS_PARTITIONS)
+    ),
+]
+
+
+async def timed(conn: AsyncConnection, statement: str, repeat: int = 1, **params) -> float:
+    """Run the statement `repeat` times, return the median duration in milliseconds."""
+    durations = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await conn.execute(text(statement), params)
+        durations.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(durations)
+
+
+async def run(rows: int, containers: int, repeat: int) -> list[tuple[str, float, float]]:
+    engine = get_db_engine()
+    results = []
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+
+        for statement in SETUP:
+            await conn.execute(text(statement))
+
+        await conn.execute(
+            text(
+                f"""
+                INSERT INTO {SCHEMA}.source
+                    (sponsor_name, sponsor_external_id, sponsor_container_id)
+                SELECT
+                    'SPONSOR_' || (i % 3),
+                    'EXTERNAL_ID_' || i,
+                    'CONTAINER_ID_' || (i % :containers)
+                FROM generate_series(1, :rows) AS i
+                """  # nosec: B608
+            ),
+            {"rows": rows, "containers": containers},
+        )
+
+        for table in ("plain", "partitioned"):
+            await conn.execute(
+                text(f"INSERT INTO {SCHEMA}.{table} SELECT * FROM {SCHEMA}.source")  # nosec: B608
+            )
+            await conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.{table}"))
+
+        await conn.execute(
+            text(
+                f"""
+                INSERT INTO {SCHEMA}.entitlement_ids
+                SELECT id, sponsor_container_id FROM {SCHEMA}.source
+                """  # nosec: B608
+            )
+        )
+        await conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.entitlement_ids"))
+
+        result = await conn.execute(
+            text(
+                f"""
+                SELECT id FROM {SCHEMA}.source
+                WHERE sponsor_container_id = 'CONTAINER_ID_1' LIMIT 1
+                """  # nosec: B608
+            )
+        )
+        id = result.scalar_one()
+
+        async def compare(
+            name: str, statement: str, partitioned_statement: str | None = None, **params
+        ) -> None:
+            partitioned_statement = partitioned_statement or statement
+            plain = await timed(conn, statement.format(table="plain"), repeat, **params)
+            partitioned = await timed(
+                conn, partitioned_statement.format(table="partitioned"), repeat, **params
+            )
+            results.append((name, plain, partitioned))
+
+        await compare(
+            "count container entitlements (ms)",
+            f"SELECT count(*) FROM {SCHEMA}.{{table}} WHERE sponsor_container_id = :container",  # nosec: B608
+            container="CONTAINER_ID_0",
+        )
+        await compare(
+            "first page of container (ms)",
+            f"SELECT * FROM {SCHEMA}.{{table}} WHERE sponsor_container_id = :container LIMIT 50",  # nosec: B608
+            container="CONTAINER_ID_0",
+        )
+        await compare(
+            "get by id and container (ms)",
+            f"""
+            SELECT * FROM {SCHEMA}.{{table}}
+            WHERE id = :id AND sponsor_container_id = :container
+            """,  # nosec: B608
+            id=id,
+            container="CONTAINER_ID_1",
+        )
+        await compare(
+            "get by id, all partitions (ms)",
+            f"SELECT * FROM {SCHEMA}.{{table}} WHERE id = :id",  # nosec: B608
+            id=id,
+        )
+        # When only the id is known, the collections look its container up in entitlement_ids
+        await compare(
+            "get by id via entitlement_ids (ms)",
+            f"SELECT * FROM {SCHEMA}.{{table}} WHERE id = :id",  # nosec: B608
+            f"""
+            SELECT * FROM {SCHEMA}.{{table}}
+            WHERE id = :id AND sponsor_container_id = (
+                SELECT sponsor_container_id FROM {SCHEMA}.entitlement_ids WHERE id = :id
+            )
+            """,  # nosec: B608
+            id=id,
+        )
+
+        sizes = []
+
+        for table in ("plain", "partitioned"):
+            result = await conn.execute(
+                text(
+                    """
+                    SELECT coalesce(sum(pg_relation_size(indexrelid)), 0)::bigint
+                    FROM pg_index
+                    WHERE indrelid IN (
+                        SELECT :table ::regclass
+                        UNION ALL
+                        SELECT inhrelid FROM pg_inherits WHERE inhparent = :table ::regclass
+                    )
+                    """
+                ),
+                {"table": f"{SCHEMA}.{table}"},
+            )
+            sizes.append(result.scalar_one() / 1024 / 1024)
+
+        # The partitioned table also needs entitlement_ids for the uniqueness of the ids
+        result = await conn.execute(
+            text(f"SELECT pg_indexes_size('{SCHEMA}.entitlement_ids')")  # nosec: B608
+        )
+        sizes[1] += result.scalar_one() / 1024 / 1024
+
+        results.append(("index size (MiB)", *sizes))
+
+        # Update all the entitlements of one container, then vacuum the table. For the
+        # partitioned table only the partition of the container needs to be vacuumed.
+        result = await conn.execute(
+            text(
+                f"""
+                SELECT tableoid::regclass::text FROM {SCHEMA}.partitioned
+                WHERE sponsor_container_id = 'CONTAINER_ID_0' LIMIT 1
+                """  # nosec: B608
+            )
+        )
+        container_partition = result.scalar_one()
+
+        update = (
+            f"UPDATE {SCHEMA}.{{table}} SET version = version + 1 "
+            "WHERE sponsor_container_id = 'CONTAINER_ID_0'"  # nosec: B608
+        )
+        await conn.execute(text(update.format(table="plain")))
+        await conn.execute(text(update.format(table="partitioned")))
+
+        results.append(
+            (
+                "vacuum after container update (ms)",
+                await timed(conn, f"VACUUM {SCHEMA}.plain"),
+                await timed(conn, f"VACUUM {container_partition}"),
+            )
+        )
+
+        await conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+    await engine.dispose()
+
+    return results
+
+
+def main(
+    rows: int = typer.Option(1_000_000, help="Number of entitlements to insert in each table"),
+    containers: int = typer.Option(1_000, help="Number of distinct sponsor containers"),
+    repeat: int = typer.Option(5, help="Number of runs of each query (the median is reported)"),
+):
+    results = asyncio.run(run(rows, containers, repeat))
+
+    typer.echo(f"{'':<36}{'plain':>14}{'partitioned':>14}")
+
+    for name, plain, partitioned in results:
+        typer.echo(f"{name:<36}{plain:>14.2f}{partitioned:>14.2f}")
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -0,0 +1,88 @@
+"""
+Measure the cold start of the application, as experienced by a freshly spawned
+gunicorn worker: the time it takes to import `app.main`, to build the app, and to
+serve the first request(s).
+
+Every worker is simulated by a fresh Python interpreter, so nothing is cached between runs.
+"""
+
+import json
+import os
+import statistics
+import subprocess  # nosec: B404
+import sys
+
+import typer
+
+WORKER_CODE = """
+import asyncio
+import json
+import sys
+import time
+
+start = time.perf_counter()
+
+from app.main import create_app
+
+imported = time.perf_counter()
+
+app = create_app()
+
+created = time.perf_counter()
+
+
+async def request(path):
+    from httpx import ASGITransport, AsyncClient
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://v1/") as client:
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        return time.perf_counter() - started
+
+
+timings = {"import": imported - start, "create_app": created - imported}
+
+for path in sys.argv[1:]:
+    timings[f"GET {path}"] = asyncio.run(request(path))
+
+print(json.dumps(timings))
+"""
+
+
+def run_worker(paths: list[str]) -> dict[str, float]:
+    result = subprocess.run(  # nosec: B603
+        [sys.executable, "-c", WORKER_CODE, *paths],
+        stdout=subprocess.PIPE,
+        check=True,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+def main(
+    workers: int = typer.Option(5, help="Number of cold workers to spawn, one after the other"),
+    path: list[str] = typer.Option(
+        ["/openapi.json"],
+        help=(
+            "Paths to request once the app is created. "
+            "Use e.g. /entitlements/ to include the database connection in the measurement."
+        ),
+    ),
+):
+    results = [run_worker(path) for _ in range(workers)]
+
+    typer.echo(f"{'step':<30}{'min (ms)':>12}{'median (ms)':>14}{'max (ms)':>12}")
+
+    for step in results[0]:
+        timings = [result[step] * 1000 for result in results]
+        typer.echo(
+            f"{step:<30}{min(timings):>12.1f}{statistics.median(timings):>14.1f}"
+            f"{max(timings):>12.1f}"
+        )
+
+
+if __name__ == "__main__":
+    typer.run(main)
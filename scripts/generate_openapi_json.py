@@ -4,10 +4,15 @@ import pathlib
 import typer
 from fastapi.openapi.utils import get_openapi
 
-from app.main import app
+from app.conf import Settings
+from app.main import create_app
 
 
 def main(output: pathlib.Path):
+    # NOTE: Only the settings' defaults are needed to build the schema, constructing them
+    #       without validation means no database credentials have to be configured.
+    app = create_app(Settings.model_construct())
+
     with output.open("w") as f:
         json.dump(
             get_openapi(
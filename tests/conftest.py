@@ -1,7 +1,7 @@
 import uuid
-from collections.abc import AsyncGenerator
+from collections.abc import AsyncGenerator, Callable, Iterator
+from contextlib import AbstractContextManager, contextmanager
 
-import fastapi_pagination
 import pytest
 from fastapi import FastAPI
 from httpx import ASGITransport, AsyncClient
@@ -11,9 +11,10 @@ from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.collections import EntitlementCollection
-from app.db import db_engine
-from app.main import app
+from app.db import get_db_engine
+from app.main import create_app
 from app.models import Entitlement, EntitlementCreate
+from app.query_counter import QueryCounter, count_queries
 
 
 def pytest_collection_modifyitems(items):
@@ -25,12 +26,12 @@ def pytest_collection_modifyitems(items):
 
 @pytest.fixture(scope="session", autouse=True)
 def fastapi_app() -> FastAPI:
-    fastapi_pagination.add_pagination(app)
-    return app
+    return create_app()
 
 
 @pytest.fixture(autouse=True)
 async def db_session() -> AsyncGenerator[AsyncSession]:
+    db_engine = get_db_engine()
     session = sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
 
     async with session() as s:
@@ -53,6 +54,30 @@ async def api_client(fastapi_app: FastAPI) -> AsyncGenerator[AsyncClient]:
         yield client
 
 
+@pytest.fixture
+def assert_max_queries() -> Callable[[int], AbstractContextManager[QueryCounter]]:
+    """
+    Assert the maximum number of SQL queries executed within a block, e.g.
+
+    .. code-block:: python
+
+        with assert_max_queries(2):
+            await api_client.get("/entitlements/")
+    """
+
+    @contextmanager
+    def _assert_max_queries(max_queries: int) -> Iterator[QueryCounter]:
+        with count_queries() as counter:
+            yield counter
+
+        assert counter.count <= max_queries, (
+            f"Expected at most {max_queries} queries, {counter.count} were executed:\n"
+            + "\n".join(counter.statements)
+        )
+
+    return _assert_max_queries
+
+
 @pytest.fixture
 def entitlements_collection(db_session: AsyncSession) -> EntitlementCollection:
     return EntitlementCollection(db_session)
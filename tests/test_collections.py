@@ -0,0 +1,118 @@
+import re
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+from sqlmodel import col, select, text, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.collections import EntitlementCollection
+from app.models import ENTITLEMENTS_PARTITIONS, Entitlement, EntitlementId
+
+
+async def get_scanned_partitions(
+    db_session: AsyncSession, statement, analyze: bool = False
+) -> set[str]:
+    """
+    The partitions in the plan of the statement, or with `analyze`, the partitions actually
+    scanned when running it (which excludes the ones pruned at execution time).
+    """
+    compiled = statement.compile(
+        dialect=db_session.bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+    if analyze:
+        results = await db_session.exec(text(f"EXPLAIN ANALYZE {compiled}"))
+        pattern = r" on (entitlements_p\d+) .*\(actual"
+    else:
+        results = await db_session.exec(text(f"EXPLAIN {compiled}"))
+        pattern = r" on (entitlements_p\d+)"
+
+    plan = "\n".join(row[0] for row in results.all())
+    return set(re.findall(pattern, plan))
+
+
+async def test_entitlements_are_partitioned(db_session: AsyncSession):
+    results = await db_session.exec(
+        text("SELECT count(*) FROM pg_inherits WHERE inhparent = 'entitlements'::regclass")
+    )
+
+    assert results.one()[0] == ENTITLEMENTS_PARTITIONS
+
+
+async def test_sponsor_container_filter_prunes_partitions(
+    entitlements_collection: EntitlementCollection, db_session: AsyncSession
+):
+    unfiltered = select(Entitlement)
+    filtered = entitlements_collection._filter_partition(select(Entitlement), "CONTAINER_ID_1")
+
+    assert len(await get_scanned_partitions(db_session, unfiltered)) == ENTITLEMENTS_PARTITIONS
+    assert len(await get_scanned_partitions(db_session, filtered)) == 1
+
+
+async def test_id_filter_prunes_partitions_at_execution_time(
+    entitlement_aws: Entitlement,
+    entitlements_collection: EntitlementCollection,
+    db_session: AsyncSession,
+):
+    statement = entitlements_collection._filter_partition(
+        select(Entitlement).where(col(Entitlement.id) == entitlement_aws.id),
+        partition_value=None,
+        id=entitlement_aws.id,
+    )
+
+    assert len(await get_scanned_partitions(db_session, statement, analyze=True)) == 1
+
+
+async def test_entitlement_ids_are_kept_in_sync(
+    entitlement_aws: Entitlement,
+    entitlement_gcp: Entitlement,
+    entitlements_collection: EntitlementCollection,
+    db_session: AsyncSession,
+):
+    async def get_entitlement_ids() -> dict:
+        results = await db_session.exec(select(EntitlementId))
+        return {obj.id: obj.sponsor_container_id for obj in results.all()}
+
+    assert await get_entitlement_ids() == {
+        entitlement_aws.id: entitlement_aws.sponsor_container_id,
+        entitlement_gcp.id: entitlement_gcp.sponsor_container_id,
+    }
+
+    # Moved to another partition (p1 -> p2), then within the same partition (p2 -> p2)
+    for sponsor_container_id in ("CONTAINER_ID_1", "CONTAINER_ID_2", "CONTAINER_ID_6"):
+        await db_session.exec(
+            update(Entitlement)
+            .where(col(Entitlement.id) == entitlement_aws.id)
+            .values(sponsor_container_id=sponsor_container_id)
+        )
+        assert (await get_entitlement_ids())[entitlement_aws.id] == sponsor_container_id
+
+    await entitlements_collection.delete(entitlement_gcp.id)
+
+    assert await get_entitlement_ids() == {entitlement_aws.id: "CONTAINER_ID_6"}
+
+
+async def test_entitlement_ids_are_unique_across_partitions(
+    entitlement_aws: Entitlement, db_session: AsyncSession
+):
+    duplicate = Entitlement(
+        id=entitlement_aws.id,
+        sponsor_name="AWS",
+        sponsor_external_id="EXTERNAL_ID_1",
+        sponsor_container_id=f"{entitlement_aws.sponsor_container_id}_OTHER",
+    )
+    db_session.add(duplicate)
+
+    with pytest.raises(IntegrityError, match=f"Duplicate entitlement ID {entitlement_aws.id}"):
+        await db_session.commit()
+
+
+async def test_delete_entitlement_of_sponsor_container(
+    entitlement_aws: Entitlement, entitlements_collection: EntitlementCollection
+):
+    await entitlements_collection.delete(entitlement_aws.id, partition_value="CONTAINER_ID_1")
+    assert await entitlements_collection.get(entitlement_aws.id) == entitlement_aws
+
+    await entitlements_collection.delete(
+        entitlement_aws.id, partition_value=entitlement_aws.sponsor_container_id
+    )
+    assert await entitlements_collection._get_or_none(entitlement_aws.id) is None
@@ -0,0 +1,55 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from httpx import ASGITransport, AsyncClient
+
+from app.compression import CompressionMiddleware, negotiate_encoding
+
+
+@pytest.mark.parametrize(
+    ("accept_encoding", "expected"),
+    [
+        ("", None),
+        ("identity", None),
+        ("gzip", "gzip"),
+        ("gzip, deflate, br", "br"),
+        ("gzip, br, zstd", "zstd"),
+        ("gzip;q=1.0, br;q=0.5", "gzip"),
+        ("zstd;q=0, gzip", "gzip"),
+        ("*", "zstd"),
+        ("*;q=0.5, gzip", "gzip"),
+        ("GZIP;Q=0.8", "gzip"),
+        ("gzip;q=invalid", None),
+    ],
+)
+def test_negotiate_encoding(accept_encoding: str, expected: str | None):
+    assert negotiate_encoding(accept_encoding) == expected
+
+
+async def test_streaming_responses_are_compressed():
+    async def stream():
+        for _ in range(10):
+            yield b"x" * 100
+
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=500)
+
+    @app.get("/stream")
+    async def get_stream():
+        return StreamingResponse(stream(), media_type="text/plain")
+
+    @app.get("/events")
+    async def get_events():
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test/") as client:
+        response = await client.get("/stream", headers={"Accept-Encoding": "gzip"})
+
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        assert response.content == b"x" * 1000
+
+        response = await client.get("/events", headers={"Accept-Encoding": "gzip"})
+
+        assert "content-encoding" not in response.headers
+        assert response.content == b"x" * 1000
@@ -1,10 +1,14 @@
+import asyncio
 import uuid
 
+import pytest
+from fastapi import FastAPI
 from httpx import AsyncClient
-from sqlmodel import select
+from sqlmodel import col, select, update
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from app.collections import EntitlementCollection
+from app.db import get_db_engine
 from app.models import Entitlement, EntitlementCreate
 from tests.utils import assert_json_contains_model
 
@@ -66,9 +70,10 @@ async def test_get_all_entitlements_empty_db(api_client: AsyncClient):
 
 
 async def test_get_all_entitlements_single_page(
-    entitlement_aws, entitlement_gcp, api_client: AsyncClient
+    entitlement_aws, entitlement_gcp, api_client: AsyncClient, assert_max_queries
 ):
-    response = await api_client.get("/entitlements/")
+    with assert_max_queries(2):
+        response = await api_client.get("/entitlements/")
 
     assert response.status_code == 200
     data = response.json()
@@ -127,13 +132,93 @@ async def test_get_all_entitlements_multiple_pages(
     assert all_external_ids == {f"EXTERNAL_ID_{index}" for index in range(10)}
 
 
+async def test_get_all_entitlements_with_fields_projection(
+    entitlement_aws, entitlement_gcp, api_client: AsyncClient
+):
+    response = await api_client.get(
+        "/entitlements/", params={"fields": "sponsor_name,activated_at"}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["total"] == 2
+    assert {item["id"] for item in data["items"]} == {
+        str(entitlement_aws.id),
+        str(entitlement_gcp.id),
+    }
+
+    for item in data["items"]:
+        assert set(item.keys()) == {"id", "sponsor_name", "activated_at"}
+
+
+async def test_get_all_entitlements_with_unknown_fields(api_client: AsyncClient):
+    response = await api_client.get("/entitlements/", params={"fields": "sponsor_name,created_at"})
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == "Unknown fields for EntitlementRead: created_at"
+
+
+async def test_get_all_entitlements_of_sponsor_container(
+    entitlement_aws, entitlement_gcp, api_client: AsyncClient
+):
+    response = await api_client.get(
+        "/entitlements/", params={"sponsor_container_id": entitlement_gcp.sponsor_container_id}
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+
+    assert data["total"] == 1
+    assert_json_contains_model(data, entitlement_gcp)
+
+    response = await api_client.get(
+        "/entitlements/",
+        params={
+            "sponsor_container_id": entitlement_aws.sponsor_container_id,
+            "fields": "sponsor_name",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json()["items"] == [{"id": str(entitlement_aws.id), "sponsor_name": "AWS"}]
+
+
+async def test_get_all_entitlements_compressed(
+    entitlements_collection: EntitlementCollection, api_client: AsyncClient
+):
+    for index in range(10):
+        await entitlements_collection.create(
+            EntitlementCreate(
+                sponsor_name="AWS",
+                sponsor_external_id=f"EXTERNAL_ID_{index}",
+                sponsor_container_id=f"CONTAINER_ID_{index}",
+            )
+        )
+
+    for encoding in ("gzip", "br", "zstd"):
+        response = await api_client.get("/entitlements/", headers={"Accept-Encoding": encoding})
+
+        assert response.status_code == 200
+        assert response.headers["content-encoding"] == encoding
+        assert response.json()["total"] == 10
+
+
+async def test_get_all_entitlements_small_response_is_not_compressed(api_client: AsyncClient):
+    response = await api_client.get("/entitlements/", headers={"Accept-Encoding": "gzip"})
+
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+
+
 # =====================
 # Get Entitlement by ID
 # =====================
 
 
-async def test_get_entitlement_by_id(entitlement_aws, api_client: AsyncClient):
-    response = await api_client.get(f"/entitlements/{entitlement_aws.id}")
+async def test_get_entitlement_by_id(entitlement_aws, api_client: AsyncClient, assert_max_queries):
+    with assert_max_queries(1):
+        response = await api_client.get(f"/entitlements/{entitlement_aws.id}")
 
     assert response.status_code == 200
     data = response.json()
@@ -144,6 +229,25 @@ async def test_get_entitlement_by_id(entitlement_aws, api_client: AsyncClient):
     assert data["sponsor_container_id"] == entitlement_aws.sponsor_container_id
 
 
+async def test_get_entitlement_by_id_and_sponsor_container(
+    entitlement_aws, entitlement_gcp, api_client: AsyncClient
+):
+    response = await api_client.get(
+        f"/entitlements/{entitlement_aws.id}",
+        params={"sponsor_container_id": entitlement_aws.sponsor_container_id},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["id"] == str(entitlement_aws.id)
+
+    response = await api_client.get(
+        f"/entitlements/{entitlement_aws.id}",
+        params={"sponsor_container_id": entitlement_gcp.sponsor_container_id},
+    )
+
+    assert response.status_code == 404
+
+
 async def test_get_non_existant_entitlement(api_client: AsyncClient):
     id = str(uuid.uuid4())
     response = await api_client.get(f"/entitlements/{id}")
@@ -152,6 +256,105 @@ async def test_get_non_existant_entitlement(api_client: AsyncClient):
     assert response.json()["detail"] == f"Entitlement with ID {id} wasn't found"
 
 
+async def test_get_entitlement_by_id_with_fields_projection(
+    entitlement_aws, api_client: AsyncClient
+):
+    response = await api_client.get(
+        f"/entitlements/{entitlement_aws.id}", params={"fields": "sponsor_external_id"}
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "id": str(entitlement_aws.id),
+        "sponsor_external_id": entitlement_aws.sponsor_external_id,
+    }
+
+
+async def test_get_non_existant_entitlement_with_fields_projection(api_client: AsyncClient):
+    id = str(uuid.uuid4())
+    response = await api_client.get(f"/entitlements/{id}", params={"fields": "sponsor_name"})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == f"Entitlement with ID {id} wasn't found"
+
+
+async def test_fields_projection_in_openapi_schema(fastapi_app: FastAPI):
+    schema = fastapi_app.openapi()
+    responses = schema["paths"]["/entitlements/{id}"]["get"]["responses"]
+
+    assert responses["200"]["content"]["application/json"]["schema"]["anyOf"] == [
+        {"$ref": "#/components/schemas/EntitlementRead"},
+        {"$ref": "#/components/schemas/EntitlementProjection"},
+    ]
+    assert schema["components"]["schemas"]["EntitlementProjection"]["required"] == ["id"]
+
+
+# ===================
+# Lookup Entitlements
+# ===================
+
+
+async def test_lookup_entitlements(
+    entitlement_aws, entitlement_gcp, api_client: AsyncClient, assert_max_queries
+):
+    missing_id = str(uuid.uuid4())
+
+    with assert_max_queries(1):
+        response = await api_client.post(
+            "/entitlements/lookup",
+            json={
+                "ids": [
+                    str(entitlement_gcp.id),
+                    missing_id,
+                    str(entitlement_aws.id),
+                    str(entitlement_gcp.id),
+                ]
+            },
+        )
+
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [item["id"] for item in data["items"]] == [
+        str(entitlement_gcp.id),
+        str(entitlement_aws.id),
+    ]
+    assert data["not_found"] == [missing_id]
+    assert_json_contains_model(data, entitlement_aws)
+
+
+async def test_lookup_entitlements_of_sponsor_container(
+    entitlement_aws, entitlement_gcp, api_client: AsyncClient
+):
+    response = await api_client.post(
+        "/entitlements/lookup",
+        params={"sponsor_container_id": entitlement_aws.sponsor_container_id},
+        json={"ids": [str(entitlement_aws.id), str(entitlement_gcp.id)]},
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+
+    assert [item["id"] for item in data["items"]] == [str(entitlement_aws.id)]
+    assert data["not_found"] == [str(entitlement_gcp.id)]
+
+
+async def test_lookup_entitlements_with_invalid_ids(api_client: AsyncClient):
+    response = await api_client.post("/entitlements/lookup", json={"ids": []})
+
+    assert response.status_code == 422
+    [detail] = response.json()["detail"]
+    assert detail["type"] == "too_short"
+
+    response = await api_client.post(
+        "/entitlements/lookup", json={"ids": [str(uuid.uuid4()) for _ in range(1001)]}
+    )
+
+    assert response.status_code == 422
+    [detail] = response.json()["detail"]
+    assert detail["type"] == "too_long"
+
+
 # ==================
 # Update Entitlement
 # ==================
@@ -169,9 +372,176 @@ async def test_can_update_entitlements(entitlement_aws, api_client):
     update_data = update_response.json()
 
     assert update_data["sponsor_name"] == "GCP"
+    assert update_data["version"] == entitlement_aws.version + 1
 
     get_response = await api_client.get(f"/entitlements/{entitlement_aws.id}")
     assert get_response.json()["sponsor_name"] == "GCP"
+    assert get_response.json()["version"] == entitlement_aws.version + 1
+
+
+async def test_update_entitlement_with_current_version(
+    entitlement_aws, api_client: AsyncClient, assert_max_queries
+):
+    with assert_max_queries(1):
+        response = await api_client.patch(
+            f"/entitlements/{entitlement_aws.id}",
+            json={"sponsor_name": "GCP", "version": entitlement_aws.version},
+        )
+
+    assert response.status_code == 200
+    assert response.json()["sponsor_name"] == "GCP"
+    assert response.json()["version"] == entitlement_aws.version + 1
+
+
+async def test_update_entitlement_with_stale_version(entitlement_aws, api_client: AsyncClient):
+    response = await api_client.patch(
+        f"/entitlements/{entitlement_aws.id}",
+        json={"sponsor_name": "GCP", "version": entitlement_aws.version - 1},
+    )
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == (
+        f"Entitlement with ID {entitlement_aws.id} has been modified, "
+        f"it's no longer at version {entitlement_aws.version - 1}"
+    )
+
+    get_response = await api_client.get(f"/entitlements/{entitlement_aws.id}")
+    assert get_response.json()["sponsor_name"] == "AWS"
+    assert get_response.json()["version"] == entitlement_aws.version
+
+
+@pytest.mark.parametrize("with_version", [False, True])
+async def test_update_entitlement_without_changes(
+    entitlement_aws, api_client: AsyncClient, assert_max_queries, with_version: bool
+):
+    data = {"version": entitlement_aws.version} if with_version else {}
+
+    with assert_max_queries(1):
+        response = await api_client.patch(f"/entitlements/{entitlement_aws.id}", json=data)
+
+    assert response.status_code == 200
+    assert response.json()["version"] == entitlement_aws.version
+
+    get_response = await api_client.get(f"/entitlements/{entitlement_aws.id}")
+    assert get_response.json()["version"] == entitlement_aws.version
+
+
+async def test_update_entitlement_without_changes_with_stale_version(
+    entitlement_aws, api_client: AsyncClient
+):
+    response = await api_client.patch(
+        f"/entitlements/{entitlement_aws.id}", json={"version": entitlement_aws.version - 1}
+    )
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == (
+        f"Entitlement with ID {entitlement_aws.id} has been modified, "
+        f"it's no longer at version {entitlement_aws.version - 1}"
+    )
+
+
+async def test_try_update_non_existant_entitlement_without_changes(api_client: AsyncClient):
+    id = str(uuid.uuid4())
+    response = await api_client.patch(f"/entitlements/{id}", json={})
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == f"Entitlement with ID {id} wasn't found"
+
+
+async def test_concurrent_updates_of_the_same_version(entitlement_aws, api_client: AsyncClient):
+    responses = await asyncio.gather(
+        *(
+            api_client.patch(
+                f"/entitlements/{entitlement_aws.id}",
+                json={"sponsor_name": sponsor_name, "version": entitlement_aws.version},
+            )
+            for sponsor_name in ("GCP", "Azure")
+        )
+    )
+
+    assert sorted(response.status_code for response in responses) == [200, 409]
+
+    [updated] = [response.json() for response in responses if response.status_code == 200]
+    get_response = await api_client.get(f"/entitlements/{entitlement_aws.id}")
+    assert get_response.json()["sponsor_name"] == updated["sponsor_name"]
+    assert get_response.json()["version"] == entitlement_aws.version + 1
+
+
+async def test_update_entitlement_of_sponsor_container(
+    entitlement_aws, entitlement_gcp, api_client: AsyncClient
+):
+    response = await api_client.patch(
+        f"/entitlements/{entitlement_aws.id}",
+        params={"sponsor_container_id": entitlement_gcp.sponsor_container_id},
+        json={"sponsor_name": "GCP"},
+    )
+
+    assert response.status_code == 404
+
+    response = await api_client.patch(
+        f"/entitlements/{entitlement_aws.id}",
+        params={"sponsor_container_id": entitlement_aws.sponsor_container_id},
+        json={"sponsor_container_id": "CONTAINER_ID_MOVED"},
+    )
+
+    assert response.status_code == 200
+    assert response.json()["sponsor_container_id"] == "CONTAINER_ID_MOVED"
+
+    get_response = await api_client.get(
+        f"/entitlements/{entitlement_aws.id}", params={"sponsor_container_id": "CONTAINER_ID_MOVED"}
+    )
+    assert get_response.status_code == 200
+
+
+@pytest.mark.parametrize(
+    ("sponsor_container_id", "new_sponsor_container_id"),
+    [
+        # Moved to another partition (p1 -> p2), the PATCH fails to lock the row
+        ("CONTAINER_ID_1", "CONTAINER_ID_2"),
+        # Kept in the same partition (p0), the PATCH no longer matches the row
+        ("CONTAINER_ID_3", "CONTAINER_ID_7"),
+    ],
+)
+async def test_update_entitlement_while_its_sponsor_container_is_updated(
+    entitlements_collection: EntitlementCollection,
+    api_client: AsyncClient,
+    sponsor_container_id: str,
+    new_sponsor_container_id: str,
+):
+    entitlement = await entitlements_collection.create(
+        EntitlementCreate(
+            sponsor_name="AWS",
+            sponsor_external_id="EXTERNAL_ID_1",
+            sponsor_container_id=sponsor_container_id,
+        )
+    )
+
+    async with get_db_engine().connect() as conn:
+        await conn.execute(
+            update(Entitlement)
+            .where(col(Entitlement.id) == entitlement.id)
+            .values(sponsor_container_id=new_sponsor_container_id)
+        )
+
+        # The PATCH waits for the row to be unlocked
+        patch = asyncio.create_task(
+            api_client.patch(f"/entitlements/{entitlement.id}", json={"sponsor_name": "GCP"})
+        )
+        await asyncio.sleep(0.5)
+        assert not patch.done()
+
+        await conn.commit()
+
+    response = await patch
+
+    assert response.status_code == 409
+    assert response.json()["detail"] == (
+        f"Entitlement with ID {entitlement.id} has been modified concurrently"
+    )
+
+    get_response = await api_client.get(f"/entitlements/{entitlement.id}")
+    assert get_response.json()["sponsor_container_id"] == new_sponsor_container_id
+    assert get_response.json()["sponsor_name"] == "AWS"
 
 
 async def test_try_update_non_existant_entitlement(api_client: AsyncClient):
@@ -185,6 +555,17 @@ async def test_try_update_non_existant_entitlement(api_client: AsyncClient):
     assert response.json()["detail"] == f"Entitlement with ID {id} wasn't found"
 
 
+async def test_try_update_non_existant_entitlement_with_version(api_client: AsyncClient):
+    id = str(uuid.uuid4())
+    response = await api_client.patch(
+        f"/entitlements/{id}",
+        json={"sponsor_name": "GCP", "version": 1},
+    )
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == f"Entitlement with ID {id} wasn't found"
+
+
 async def test_try_update_entitlement_with_invalid_data(entitlement_aws, api_client: AsyncClient):
     response = await api_client.patch(
         f"/entitlements/{entitlement_aws.id}",
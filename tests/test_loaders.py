@@ -0,0 +1,166 @@
+import asyncio
+import uuid
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from httpx import ASGITransport, AsyncClient
+
+from app.collections import EntitlementCollection
+from app.db import DBSession
+from app.loaders import CollectionLoader
+from app.models import Entitlement
+from app.routers.entitlements import EntitlementLoader
+
+
+async def test_loads_within_the_same_tick_are_batched(
+    entitlements_collection: EntitlementCollection,
+    entitlement_aws: Entitlement,
+    entitlement_gcp: Entitlement,
+    assert_max_queries,
+):
+    loader = CollectionLoader[Entitlement](entitlements_collection)
+
+    with assert_max_queries(1):
+        results = await asyncio.gather(
+            loader.load(entitlement_gcp.id),
+            loader.load(str(entitlement_aws.id)),
+            loader.load(entitlement_gcp.id),
+        )
+
+    assert [obj.id for obj in results] == [
+        entitlement_gcp.id,
+        entitlement_aws.id,
+        entitlement_gcp.id,
+    ]
+
+    with assert_max_queries(1):
+        results = await loader.load_many([entitlement_aws.id, entitlement_gcp.id])
+
+    assert [obj.id for obj in results] == [entitlement_aws.id, entitlement_gcp.id]
+
+
+async def test_loads_in_different_ticks_are_not_batched(
+    entitlements_collection: EntitlementCollection,
+    entitlement_aws: Entitlement,
+    assert_max_queries,
+):
+    loader = CollectionLoader[Entitlement](entitlements_collection)
+
+    with assert_max_queries(2) as counter:
+        await loader.load(entitlement_aws.id)
+        await loader.load(entitlement_aws.id)
+
+    assert counter.count == 2
+
+
+async def test_entitlement_loader_is_request_scoped(
+    entitlement_aws: Entitlement, entitlement_gcp: Entitlement, assert_max_queries
+):
+    app = FastAPI()
+
+    # Everything depending on the loader within a request shares it (and its session)
+    @app.get("/sponsors")
+    async def get_sponsors(
+        id1: str, id2: str, loader: EntitlementLoader, other: EntitlementLoader, session: DBSession
+    ):
+        assert loader is other
+        assert loader.collection.session is session
+        objs = await asyncio.gather(loader.load(id1), other.load(id2))
+        return {"sponsors": [obj.sponsor_name for obj in objs]}
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://v1/") as client:
+        with assert_max_queries(1):
+            response = await client.get(
+                "/sponsors", params={"id1": str(entitlement_aws.id), "id2": str(entitlement_gcp.id)}
+            )
+
+    assert response.status_code == 200
+    assert response.json() == {"sponsors": ["AWS", "GCP"]}
+
+
+class SlowCollection:
+    """Stub collection whose get_many takes a while, and records its batches and concurrency."""
+
+    model_cls = Entitlement
+
+    def __init__(self):
+        self.batches: list[list[uuid.UUID]] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def get_many(self, ids):
+        self.batches.append(list(ids))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        await asyncio.sleep(0.01)
+
+        self.in_flight -= 1
+        return list(ids)
+
+
+async def test_loads_during_a_batch_in_flight_make_up_the_next_batch():
+    collection = SlowCollection()
+    loader = CollectionLoader[uuid.UUID](collection)
+    ids = [uuid.uuid4() for _ in range(4)]
+
+    async def load_later(*ids: uuid.UUID) -> list[uuid.UUID]:
+        await asyncio.sleep(0.001)
+        return await loader.load_many(ids)
+
+    results = await asyncio.gather(
+        loader.load(ids[0]), load_later(ids[1], ids[2]), load_later(ids[3])
+    )
+
+    assert results == [ids[0], [ids[1], ids[2]], [ids[3]]]
+    assert collection.batches == [[ids[0]], [ids[1], ids[2], ids[3]]]
+    assert collection.max_in_flight == 1
+
+    # Once all the batches are done, the next load is dispatched right away
+    assert await loader.load(ids[0]) == ids[0]
+    assert len(collection.batches) == 3
+
+
+async def test_load_invalid_id():
+    collection = SlowCollection()
+    loader = CollectionLoader[uuid.UUID](collection)
+    id = uuid.uuid4()
+
+    found, invalid = await asyncio.gather(
+        loader.load(id), loader.load("not-an-id"), return_exceptions=True
+    )
+
+    assert found == id
+    assert isinstance(invalid, HTTPException)
+    assert invalid.status_code == 404
+    assert invalid.detail == "Entitlement with ID not-an-id wasn't found"
+    assert collection.batches == [[id]]
+
+
+async def test_load_non_existant_entitlement(
+    entitlements_collection: EntitlementCollection, entitlement_aws: Entitlement
+):
+    loader = CollectionLoader[Entitlement](entitlements_collection)
+    id = uuid.uuid4()
+
+    found, not_found = await asyncio.gather(
+        loader.load(entitlement_aws.id), loader.load(id), return_exceptions=True
+    )
+
+    assert found.id == entitlement_aws.id
+    assert isinstance(not_found, HTTPException)
+    assert not_found.status_code == 404
+    assert not_found.detail == f"Entitlement with ID {id} wasn't found"
+
+
+async def test_load_errors_are_propagated(
+    entitlements_collection: EntitlementCollection, monkeypatch: pytest.MonkeyPatch
+):
+    async def get_many(ids):
+        raise RuntimeError("Database is gone")
+
+    monkeypatch.setattr(entitlements_collection, "get_many", get_many)
+    loader = CollectionLoader[Entitlement](entitlements_collection)
+
+    with pytest.raises(RuntimeError, match="Database is gone"):
+        await asyncio.gather(loader.load(uuid.uuid4()), loader.load(uuid.uuid4()))
@@ -0,0 +1,65 @@
+import logging
+
+import pytest
+from fastapi import Depends, FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlmodel import text
+
+from app.db import DBSession
+from app.query_counter import QueryBudget, QueryBudgetExceeded, QueryCounterMiddleware
+
+
+def build_app(strict: bool, default_budget: int | None = None) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(QueryCounterMiddleware, default_budget=default_budget, strict=strict)
+
+    @app.get("/two-queries", dependencies=[Depends(QueryBudget(1))])
+    async def two_queries(session: DBSession):
+        await session.exec(text("SELECT 1"))
+        await session.exec(text("SELECT 2"))
+
+    @app.get("/one-query")
+    async def one_query(session: DBSession):
+        await session.exec(text("SELECT 1"))
+
+    return app
+
+
+async def test_query_budget_exceeded_is_logged(caplog: pytest.LogCaptureFixture):
+    app = build_app(strict=False)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test/") as client:
+        with caplog.at_level(logging.WARNING, logger="app.query_counter"):
+            response = await client.get("/two-queries")
+
+    assert response.status_code == 200
+    assert caplog.messages == ["GET /two-queries executed 2 queries, exceeding its budget of 1"]
+
+
+async def test_query_budget_exceeded_raises_in_strict_mode():
+    app = build_app(strict=True)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test/") as client:
+        with pytest.raises(QueryBudgetExceeded, match="exceeding the budget of 1"):
+            await client.get("/two-queries")
+
+
+async def test_default_query_budget(caplog: pytest.LogCaptureFixture):
+    app = build_app(strict=False, default_budget=0)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test/") as client:
+        with caplog.at_level(logging.WARNING, logger="app.query_counter"):
+            await client.get("/one-query")
+
+    assert caplog.messages == ["GET /one-query executed 1 queries, exceeding its budget of 0"]
+
+
+async def test_assert_max_queries(api_client: AsyncClient, assert_max_queries):
+    with assert_max_queries(2) as counter:
+        await api_client.get("/entitlements/")
+
+    assert counter.count == 2
+
+    with pytest.raises(AssertionError, match="Expected at most 1 queries, 2 were executed"):
+        with assert_max_queries(1):
+            await api_client.get("/entitlements/")
@@ -0,0 +1,161 @@
+import logging
+from collections.abc import Iterator
+
+import pytest
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+
+from app.db import get_db_engine
+from app.models import Entitlement
+from app.slow_queries import (
+    SlowQueryLog,
+    get_parameters_shape,
+    get_slow_query_log,
+    redact_plan,
+)
+
+
+@pytest.fixture
+def slow_query_log(fastapi_app: FastAPI) -> Iterator[SlowQueryLog]:
+    slow_query_log = SlowQueryLog(threshold_ms=0, explain_sample_rate=1.0, report_size=2)
+    slow_query_log.install(get_db_engine())
+    fastapi_app.dependency_overrides[get_slow_query_log] = lambda: slow_query_log
+
+    yield slow_query_log
+
+    del fastapi_app.dependency_overrides[get_slow_query_log]
+    slow_query_log.uninstall()
+
+
+@pytest.mark.parametrize(
+    ("parameters", "expected"),
+    [
+        ((), []),
+        (("AWS", 1, None), ["str", "int", "NoneType"]),
+        ({"name": "AWS"}, {"name": "str"}),
+        ([("AWS", 1), ("GCP", 2)], {"rows": 2, "row": ["str", "int"]}),
+        (None, "NoneType"),
+    ],
+)
+def test_get_parameters_shape(parameters, expected):
+    assert get_parameters_shape(parameters) == expected
+
+
+def test_redact_plan():
+    plan = [
+        {
+            "Plan": {
+                "Node Type": "Index Scan",
+                "Relation Name": "entitlements_p1",
+                "Index Cond": "(id = '6f0d1c1e-7a8e-4b6c-9d3e-2f1a0b9c8d7e'::uuid)",
+                "Filter": "((version = 3) AND (sponsor_name = 'O''Reilly'::text) AND (id = $1))",
+                "Sort Key": ["created_at", "(version * -1.5)"],
+                "Actual Rows": 1,
+            }
+        }
+    ]
+
+    assert redact_plan(plan) == [
+        {
+            "Plan": {
+                "Node Type": "Index Scan",
+                "Relation Name": "entitlements_p1",
+                "Index Cond": "(id = ?::uuid)",
+                "Filter": "((version = ?) AND (sponsor_name = ?::text) AND (id = $1))",
+                "Sort Key": ["created_at", "(version * ?)"],
+                "Actual Rows": 1,
+            }
+        }
+    ]
+
+
+async def test_slow_queries_are_logged_and_explained(
+    entitlement_aws: Entitlement,
+    api_client: AsyncClient,
+    slow_query_log: SlowQueryLog,
+    caplog: pytest.LogCaptureFixture,
+):
+    with caplog.at_level(logging.WARNING, logger="app.slow_queries"):
+        response = await api_client.get(f"/entitlements/{entitlement_aws.id}")
+
+    assert response.status_code == 200
+    await slow_query_log.wait_for_explains()
+
+    [record] = caplog.records
+    assert record.route == "GET /entitlements/{id}"
+    assert record.parameters == ["str", "str"]
+    assert record.statement.startswith("SELECT")
+
+    [stats] = slow_query_log.report()
+    assert stats.calls == 1
+    assert stats.last_route == "GET /entitlements/{id}"
+    assert stats.plan[0]["Plan"]["Node Type"] is not None
+    assert "Shared Hit Blocks" in stats.plan[0]["Plan"]
+    assert str(entitlement_aws.id) not in str(stats.plan)
+
+
+async def test_failed_statements_are_not_recorded(slow_query_log: SlowQueryLog):
+    async with get_db_engine().connect() as conn:
+        info = dict(conn.sync_connection.info)
+
+        with pytest.raises(DBAPIError):
+            await conn.execute(text("SELECT 1 / 0"))
+
+        assert conn.sync_connection.info == info
+
+    assert slow_query_log.report() == []
+
+
+async def test_explains_run_one_at_a_time(slow_query_log: SlowQueryLog):
+    async with get_db_engine().connect() as conn:
+        await conn.execute(text("SELECT pg_sleep(0.2)"))
+        await conn.execute(text("SELECT 1"))
+
+    assert len(slow_query_log._explain_tasks) == 1
+
+    await slow_query_log.wait_for_explains()
+
+    plans = {stats.statement: stats.plan for stats in slow_query_log.report()}
+    assert plans["SELECT pg_sleep(0.2)"] is not None
+    assert plans["SELECT 1"] is None
+
+
+async def test_explains_time_out(slow_query_log: SlowQueryLog, caplog: pytest.LogCaptureFixture):
+    slow_query_log.explain_timeout_ms = 50
+
+    async with get_db_engine().connect() as conn:
+        await conn.execute(text("SELECT pg_sleep(0.2)"))
+
+    with caplog.at_level(logging.ERROR, logger="app.slow_queries"):
+        await slow_query_log.wait_for_explains()
+
+    [stats] = slow_query_log.report()
+    assert stats.plan is None
+    assert "canceling statement due to statement timeout" in caplog.text
+
+
+async def test_slow_queries_report(
+    entitlement_aws: Entitlement, api_client: AsyncClient, slow_query_log: SlowQueryLog
+):
+    for _ in range(3):
+        await api_client.get("/entitlements/")
+
+    await slow_query_log.wait_for_explains()
+
+    response = await api_client.get("/diagnostics/slow-queries")
+
+    assert response.status_code == 200
+    data = response.json()
+
+    assert len(data) == 2
+    assert all(item["calls"] == 3 for item in data)
+    assert data[0]["total_duration_ms"] >= data[1]["total_duration_ms"]
+
+
+async def test_slow_queries_report_disabled(api_client: AsyncClient):
+    response = await api_client.get("/diagnostics/slow-queries")
+
+    assert response.status_code == 200
+    assert response.json() == []